@@ -0,0 +1,163 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select
+import serialization
+from db import Database, Thread, ThreadRun, BatchItem
+from llm import build_prompt_messages, load_litellm
+from message_model import AssistantMessage
+from message_thread_manager import MessageThreadManager
+from thread_forks import resolve_messages, resolve_messages_blob
+
+class BatchRunner:
+    """Runs one LLM completion per thread for many threads at once (evals, backfills).
+
+    Progress is checkpointed per (batch_id, thread_id) in `batch_items`, so re-running
+    the same batch_id only processes threads that have not completed yet.
+    """
+
+    def __init__(self, db: Database, chunk_size: int = 50, max_workers: int = 16):
+        self.db = db
+        self.thread_manager = MessageThreadManager(db)
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+
+    async def pending_thread_ids(self, batch_id: str, thread_ids: List[int]) -> List[int]:
+        async with self.db.get_async_session() as session:
+            stmt = select(BatchItem.thread_id).where(BatchItem.batch_id == batch_id, BatchItem.status == 'completed')
+            result = await session.execute(stmt)
+            completed = set(result.scalars().all())
+        return [thread_id for thread_id in thread_ids if thread_id not in completed]
+
+    async def build_prompts(self, thread_ids: List[int], system_message: Dict[str, Any], model_name: str, additional_instructions: Optional[str] = None) -> Dict[int, List[Dict[str, Any]]]:
+        async with self.db.get_async_session() as session:
+            threads = (await session.execute(select(Thread).where(Thread.thread_id.in_(thread_ids)))).scalars().all()
+            return {
+                thread.thread_id: build_prompt_messages(system_message, await resolve_messages(session, thread), additional_instructions, model_name)
+                for thread in threads
+            }
+
+    async def run(self, batch_id: str, thread_ids: List[int], system_message: Dict[str, Any], model_name: str, temperature: float = 0, max_tokens: Optional[int] = None, additional_instructions: Optional[str] = None) -> Dict[str, int]:
+        pending = await self.pending_thread_ids(batch_id, thread_ids)
+        logging.info(f"Batch {batch_id}: {len(thread_ids) - len(pending)} threads already completed, {len(pending)} pending")
+        totals = {"completed": 0, "failed": 0}
+
+        for start in range(0, len(pending), self.chunk_size):
+            chunk = pending[start:start + self.chunk_size]
+            prompts = await self.build_prompts(chunk, system_message, model_name, additional_instructions)
+            chunk_ids = list(prompts.keys())
+
+            try:
+                responses = await asyncio.to_thread(
+                    load_litellm().batch_completion,
+                    model=model_name,
+                    messages=[prompts[thread_id] for thread_id in chunk_ids],
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    max_workers=self.max_workers
+                )
+            except Exception as e:
+                logging.error(f"Batch {batch_id}: chunk starting at {start} failed: {e}")
+                responses = [e] * len(chunk_ids)
+
+            results = {}
+            for thread_id, response in zip(chunk_ids, responses):
+                if isinstance(response, Exception):
+                    results[thread_id] = response
+                else:
+                    results[thread_id] = response.choices[0].message['content'] or ""
+
+            chunk_totals = await self.write_results(batch_id, results)
+            totals["completed"] += chunk_totals["completed"]
+            totals["failed"] += chunk_totals["failed"]
+            logging.info(f"Batch {batch_id}: {start + len(chunk)}/{len(pending)} threads processed")
+
+        return totals
+
+    async def write_results(self, batch_id: str, results: Dict[int, Any]) -> Dict[str, int]:
+        """Writes assistant replies (str) or failures (Exception) for many threads in one transaction."""
+        totals = {"completed": 0, "failed": 0}
+        thread_ids = list(results.keys())
+        now = datetime.now().isoformat()
+
+        async with self.db.get_async_session() as session:
+            threads = (await session.execute(select(Thread).where(Thread.thread_id.in_(thread_ids)))).scalars().all()
+            items = (await session.execute(select(BatchItem).where(BatchItem.batch_id == batch_id, BatchItem.thread_id.in_(thread_ids)))).scalars().all()
+
+            items_by_thread = {item.thread_id: item for item in items}
+            new_runs = []
+
+            for thread in threads:
+                result = results[thread.thread_id]
+                item = items_by_thread.get(thread.thread_id)
+                if item is None:
+                    item = BatchItem(batch_id=batch_id, thread_id=thread.thread_id)
+                    session.add(item)
+                item.last_updated_date = now
+
+                if isinstance(result, Exception):
+                    item.status = 'failed'
+                    item.error = str(result)
+                    totals["failed"] += 1
+                    continue
+
+                await self.thread_manager.append_to_thread(session, thread, AssistantMessage(result).to_dict())
+                # Forks that still inherit memory see their parent's modules too
+                working_memory = await self.thread_manager.working_memory.effective_modules(session, thread.thread_id)
+                new_runs.append(ThreadRun(
+                    thread_id=thread.thread_id,
+                    messages=await resolve_messages_blob(session, thread),
+                    creation_date=now,
+                    working_memory=serialization.dumps(working_memory),
+                    status='completed'
+                ))
+                item.status = 'completed'
+                item.error = None
+                totals["completed"] += 1
+
+            session.add_all(new_runs)
+            await session.commit()
+
+        return totals
+
+    async def export_batch_file(self, path: str, thread_ids: List[int], system_message: Dict[str, Any], model_name: str, temperature: float = 0, max_tokens: Optional[int] = None, additional_instructions: Optional[str] = None) -> int:
+        """Writes an OpenAI Batch API compatible JSONL request file, one line per thread."""
+        prompts = await self.build_prompts(thread_ids, system_message, model_name, additional_instructions)
+        with open(path, 'w') as f:
+            for thread_id, messages in prompts.items():
+                body = {"model": model_name, "messages": messages, "temperature": temperature}
+                if max_tokens is not None:
+                    body["max_tokens"] = max_tokens
+                f.write(serialization.dumps({
+                    "custom_id": f"thread-{thread_id}",
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": body
+                }) + "\n")
+        return len(prompts)
+
+    async def ingest_batch_results(self, path: str, batch_id: str) -> Dict[str, int]:
+        """Reads a Batch API output JSONL file and writes the replies back, skipping completed threads."""
+        results = {}
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = serialization.loads(line)
+                thread_id = int(record["custom_id"].removeprefix("thread-"))
+                response = record.get("response") or {}
+                if record.get("error") or response.get("status_code") != 200:
+                    results[thread_id] = Exception(str(record.get("error") or response.get("body")))
+                else:
+                    results[thread_id] = response["body"]["choices"][0]["message"].get("content") or ""
+
+        pending = set(await self.pending_thread_ids(batch_id, list(results.keys())))
+        totals = {"completed": 0, "failed": 0}
+        pending_ids = [thread_id for thread_id in results if thread_id in pending]
+        for start in range(0, len(pending_ids), self.chunk_size):
+            chunk = pending_ids[start:start + self.chunk_size]
+            chunk_totals = await self.write_results(batch_id, {thread_id: results[thread_id] for thread_id in chunk})
+            totals["completed"] += chunk_totals["completed"]
+            totals["failed"] += chunk_totals["failed"]
+        return totals
@@ -0,0 +1,206 @@
+"""Benchmarks for the thread, memory and LLM hot paths against a mock provider.
+
+Usage: python benchmark.py [--output bench_output.json] [--latency 0.05] [--quick] [--group-commit]
+
+No network access or API keys are needed: `llm.acompletion` is replaced by a
+scripted mock that returns tool calls after a configurable delay.
+"""
+import argparse
+import asyncio
+import os
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+# Settings are resolved on first use; point them at a scratch location before that
+_scratch_dir = tempfile.mkdtemp(prefix="automata-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_scratch_dir}/bench.db")
+os.environ.setdefault("WORKSPACE_DIR", os.path.join(_scratch_dir, "workspace"))
+
+import llm
+import serialization
+from db import Database
+from message_model import UserMessage
+from message_thread_manager import MessageThreadManager
+from working_memory_manager import WorkingMemory
+
+
+class MockMessage(dict):
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class MockCompletion:
+    """Stand-in for litellm.acompletion returning scripted tool calls."""
+
+    def __init__(self, latency: float = 0.0, script: List[Dict[str, Any]] | None = None):
+        self.latency = latency
+        self.script = script or [{"name": "example_function", "arguments": {"input_text": "benchmark"}}]
+        self.calls = 0
+
+    async def __call__(self, **params):
+        step = self.script[self.calls % len(self.script)]
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        tool_call = SimpleNamespace(
+            id=f"call_{self.calls}",
+            function=SimpleNamespace(name=step["name"], arguments=serialization.dumps(step["arguments"]))
+        )
+        message = MockMessage(role="assistant", content="", tool_calls=[tool_call])
+        usage = SimpleNamespace(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage, model=params.get("model"))
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1]
+    }
+
+
+# Extra Database options, e.g. group_commit, set from the command line
+DATABASE_OPTIONS: Dict[str, Any] = {}
+
+
+async def fresh_database(name: str) -> Database:
+    db = Database(f"sqlite+aiosqlite:///{_scratch_dir}/{name}.db", **DATABASE_OPTIONS)
+    await db.create_tables()
+    return db
+
+
+async def bench_add_message(thread_lengths: List[int], appends: int) -> Dict[str, Any]:
+    results = {}
+    for length in thread_lengths:
+        db = await fresh_database(f"add_message_{length}")
+        manager = MessageThreadManager(db)
+        thread_id = await manager.create_thread()
+        for i in range(length):
+            await manager.add_message(thread_id, UserMessage(f"filler message {i} " * 10).to_dict())
+
+        samples = []
+        for i in range(appends):
+            start = time.perf_counter()
+            await manager.add_message(thread_id, UserMessage(f"benchmark message {i}").to_dict())
+            samples.append(time.perf_counter() - start)
+        stats = summarize(samples)
+        stats["ops_per_second"] = appends / sum(samples)
+        results[str(length)] = stats
+        await db.close()
+    return results
+
+
+async def bench_run_thread(iterations: int) -> Dict[str, Any]:
+    db = await fresh_database("run_thread")
+    manager = MessageThreadManager(db)
+    thread_id = await manager.create_thread()
+    await manager.add_message(thread_id, UserMessage("Run the example tool.").to_dict())
+    # Untimed warm-up: the provider SDK is imported on first use (cost lookup) and
+    # would otherwise land in the first sample
+    await manager.run_thread(thread_id, {"role": "system", "content": "You are a benchmark."}, model_name="mock/model")
+
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await manager.run_thread(thread_id, {"role": "system", "content": "You are a benchmark."}, model_name="mock/model")
+        samples.append(time.perf_counter() - start)
+    await manager.close()
+    await db.close()
+    return summarize(samples)
+
+
+async def bench_export_memory(module_counts: List[int], repeats: int) -> Dict[str, Any]:
+    results = {}
+    for count in module_counts:
+        db = await fresh_database(f"memory_{count}")
+        manager = MessageThreadManager(db)
+        memory = WorkingMemory(db)
+        thread_id = await manager.create_thread()
+        for i in range(count):
+            await memory.add_or_update_module(thread_id, f"module_{i}", {"index": i, "notes": ["entry"] * 10})
+
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            await memory.export_memory(thread_id)
+            samples.append(time.perf_counter() - start)
+        results[str(count)] = summarize(samples)
+        await db.close()
+    return results
+
+
+async def bench_concurrent_sessions(session_counts: List[int], iterations: int) -> Dict[str, Any]:
+    llm.load_litellm()
+    results = {}
+    for count in session_counts:
+        db = await fresh_database(f"concurrent_{count}")
+        manager = MessageThreadManager(db)
+        thread_ids = [await manager.create_thread() for _ in range(count)]
+
+        async def drive(thread_id: int):
+            for _ in range(iterations):
+                await manager.run_thread(thread_id, {"role": "system", "content": "You are a benchmark."}, model_name="mock/model")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(drive(thread_id) for thread_id in thread_ids))
+        elapsed = time.perf_counter() - start
+        results[str(count)] = {
+            "elapsed": elapsed,
+            "iterations": count * iterations,
+            "iterations_per_second": count * iterations / elapsed
+        }
+        await manager.close()
+        await db.close()
+    return results
+
+
+async def run_benchmarks(latency: float, quick: bool) -> Dict[str, Any]:
+    mock = MockCompletion(latency=latency)
+    llm.acompletion = mock
+
+    scale = 1 if quick else 5
+    return {
+        "add_message": await bench_add_message([10, 100 * scale, 1000 * scale], appends=20 * scale),
+        "run_thread": await bench_run_thread(iterations=10 * scale),
+        "export_memory": await bench_export_memory([10, 50 * scale, 200 * scale], repeats=10 * scale),
+        "concurrent_sessions": await bench_concurrent_sessions([1, 4, 16], iterations=2 * scale)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock LLM latency in seconds")
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes for a fast smoke run")
+    parser.add_argument("--group-commit", action="store_true", help="Coalesce writes through the group-commit buffer")
+    parser.add_argument("--no-durable", action="store_true", help="With --group-commit, don't wait for buffered writes to commit")
+    args = parser.parse_args()
+    if args.group_commit:
+        DATABASE_OPTIONS.update(group_commit=True, durable=not args.no_durable)
+
+    results = {
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "serialization_backend": serialization.BACKEND,
+        "mock_latency": args.latency,
+        "database_options": DATABASE_OPTIONS,
+        "benchmarks": asyncio.run(run_benchmarks(args.latency, args.quick))
+    }
+    with open(args.output, "w") as f:
+        f.write(serialization.dumps(results, pretty=True))
+    print(f"Wrote benchmark results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+import serialization
+from db import Database, Thread, ThreadSummary
+from llm import make_llm_api_call
+from thread_forks import resolve_messages
+
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation below so an agent can continue the task without the original messages. "
+    "Keep the objective, decisions, facts learned, files touched, tool results that still matter and open questions. "
+    "Be concise."
+)
+
+
+async def discard_summaries_after(session: AsyncSession, thread_id: int, message_index: int):
+    """Drops summaries covering `message_index` or later, called when that message is edited or removed."""
+    await session.execute(delete(ThreadSummary).where(ThreadSummary.thread_id == thread_id, ThreadSummary.end_index > message_index))
+
+class HistoryCompactor:
+    """Summarizes older spans of long threads with a cheaper model.
+
+    Summaries are cumulative: each one covers thread.messages[0:end_index] and is stored in
+    `thread_summaries`, while the full history stays untouched in `threads.messages`.
+    Prompts use `compacted_view`, i.e. the latest summary followed by the messages after it.
+    """
+
+    def __init__(self, db: Database, model_name: str = "gpt-4o-mini", max_messages: int = 60, max_tokens: int = 40000, keep_recent: int = 20, max_chars_per_message: int = 2000):
+        self.db = db
+        self.model_name = model_name
+        self.max_messages = max_messages
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.max_chars_per_message = max_chars_per_message
+        self.tasks: Dict[int, asyncio.Task] = {}
+
+    def estimate_tokens(self, messages: List[Dict[str, Any]]) -> int:
+        return len(serialization.dumps(messages)) // 4
+
+    async def latest_summary(self, thread_id: int) -> Optional[ThreadSummary]:
+        async with self.db.get_async_session() as session:
+            stmt = select(ThreadSummary).where(ThreadSummary.thread_id == thread_id).order_by(ThreadSummary.summary_id.desc()).limit(1)
+            result = await session.execute(stmt)
+            return result.scalar_one_or_none()
+
+    def view_from_summary(self, messages: List[Dict[str, Any]], summary: Optional[ThreadSummary]) -> List[Dict[str, Any]]:
+        if summary is None or summary.end_index > len(messages):
+            # No summary yet, or the history was edited below the summarized span
+            return messages
+        summary_message = {
+            "role": "system",
+            "content": f"Summary of messages {summary.start_index}-{summary.end_index - 1} of this conversation: {summary.summary}"
+        }
+        return [summary_message] + messages[summary.end_index:]
+
+    async def compacted_view(self, thread_id: int, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self.view_from_summary(messages, await self.latest_summary(thread_id))
+
+    def needs_compaction(self, view: List[Dict[str, Any]]) -> bool:
+        return len(view) > self.max_messages or self.estimate_tokens(view) > self.max_tokens
+
+    def split_index(self, messages: List[Dict[str, Any]], start: int) -> int:
+        end = len(messages) - max(0, self.keep_recent)
+        # Don't separate tool results from the turn that produced them
+        while end > start and end < len(messages) and messages[end].get("role") == "tool":
+            end -= 1
+        return end
+
+    def render(self, messages: List[Dict[str, Any]]) -> str:
+        lines = []
+        for message in messages:
+            content = message.get("content")
+            if not isinstance(content, str):
+                content = serialization.dumps(content)
+            lines.append(f"{message.get('role')}: {content[:self.max_chars_per_message]}")
+        return "\n".join(lines)
+
+    async def compact(self, thread_id: int) -> Optional[ThreadSummary]:
+        async with self.db.get_async_session() as session:
+            thread = await session.get(Thread, thread_id)
+            if not thread:
+                return None
+            messages = await resolve_messages(session, thread)
+
+        summary = await self.latest_summary(thread_id)
+        if not self.needs_compaction(self.view_from_summary(messages, summary)):
+            return None
+
+        start = summary.end_index if summary is not None and summary.end_index <= len(messages) else 0
+        end = self.split_index(messages, start)
+        if end <= start:
+            return None
+
+        previous = f"Previous summary: {summary.summary}\n\n" if start and summary is not None else ""
+        prompt = [
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+            {"role": "user", "content": f"{previous}Conversation:\n{self.render(messages[start:end])}"}
+        ]
+        response = await make_llm_api_call(prompt, self.model_name, temperature=0)
+        summary_text = response.choices[0].message['content'] or ""
+
+        new_summary = ThreadSummary(
+            thread_id=thread_id,
+            start_index=0,
+            end_index=end,
+            summary=summary_text,
+            model_name=self.model_name,
+            creation_date=datetime.now().isoformat()
+        )
+        async with self.db.get_async_session() as session:
+            thread = await session.get(Thread, thread_id)
+            # The span may have been edited while the summary was being written
+            if not thread or (await resolve_messages(session, thread))[:end] != messages[:end]:
+                logging.info(f"Discarding summary for thread {thread_id}: history changed during compaction")
+                return None
+            session.add(new_summary)
+            await session.commit()
+        logging.info(f"Compacted thread {thread_id}: messages 0-{end - 1} summarized")
+        return new_summary
+
+    def schedule(self, thread_id: int):
+        """Starts a background compaction for the thread unless one is already running."""
+        task = self.tasks.get(thread_id)
+        if task is not None and not task.done():
+            return
+        self.tasks[thread_id] = asyncio.create_task(self.run_compaction(thread_id))
+
+    async def run_compaction(self, thread_id: int):
+        try:
+            await self.compact(thread_id)
+        except Exception as e:
+            logging.error(f"Compaction failed for thread {thread_id}: {e}")
+
+    async def drain(self):
+        pending = [task for task in self.tasks.values() if not task.done()]
+        if pending:
+            await asyncio.gather(*pending)
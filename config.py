@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 from typing import Optional
 
@@ -12,8 +13,17 @@ class Settings(BaseSettings):
     class Config:
         env_file = ".env"
 
-    def __init__(self, **values):
-        super().__init__(**values)
+    def ensure_workspace_dir(self) -> str:
         os.makedirs(self.workspace_dir, exist_ok=True)
+        return self.workspace_dir
 
-settings = Settings()
\ No newline at end of file
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    # Resolved on first use so importing modules doesn't read .env or touch the filesystem
+    return Settings()
+
+def __getattr__(name):
+    # Keeps `from config import settings` working; it resolves the settings at that point
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, UniqueConstraint
+from sqlalchemy import text, Column, Integer, String, Text, Float, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from config import settings
+from config import get_settings
 import os
+import asyncio
 from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Optional
+import tracing
+from write_buffer import GroupCommitBuffer
 
 Base = declarative_base()
 
@@ -18,6 +22,7 @@ class Thread(Base):
 
     thread_runs = relationship("ThreadRun", back_populates="thread")
     memory_modules = relationship("MemoryModule", back_populates="thread")
+    thread_metadata = relationship("ThreadMetadata", back_populates="thread", uselist=False)
 
 class ThreadRun(Base):
     __tablename__ = 'thread_runs'
@@ -31,13 +36,104 @@ class ThreadRun(Base):
 
     thread = relationship("Thread", back_populates="thread_runs")
 
+    __table_args__ = (
+        Index('ix_thread_runs_thread_status', 'thread_id', 'status'),
+    )
+
+class LLMCall(Base):
+    __tablename__ = 'llm_calls'
+
+    call_id = Column(Integer, primary_key=True)
+    thread_id = Column(Integer, ForeignKey('threads.thread_id'))
+    run_id = Column(Integer, ForeignKey('thread_runs.run_id'))  # Set once the iteration's ThreadRun is saved
+    model_name = Column(String)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    cache_read_tokens = Column(Integer, default=0)
+    cache_write_tokens = Column(Integer, default=0)
+    latency = Column(Float)
+    cost = Column(Float, default=0.0)
+    creation_date = Column(String)
+    day = Column(String)  # YYYY-MM-DD, kept separately so per-day rollups use the index
+
+    __table_args__ = (
+        Index('ix_llm_calls_thread_run', 'thread_id', 'run_id'),
+        Index('ix_llm_calls_model_day', 'model_name', 'day'),
+        Index('ix_llm_calls_day', 'day'),
+    )
+
+class ThreadFork(Base):
+    __tablename__ = 'thread_forks'
+
+    # A forked thread stores only its own messages; the first fork_index messages are read
+    # from the parent. fork_index is set to 0 once the prefix has been copied (copy-on-write).
+    thread_id = Column(Integer, ForeignKey('threads.thread_id'), primary_key=True)
+    parent_thread_id = Column(Integer, ForeignKey('threads.thread_id'), index=True)
+    fork_index = Column(Integer)
+    inherits_memory = Column(Integer, default=1)  # Memory modules fall through to the parent until either side writes
+    creation_date = Column(String)
+
+class ThreadMetadata(Base):
+    __tablename__ = 'thread_metadata'
+
+    thread_id = Column(Integer, ForeignKey('threads.thread_id'), primary_key=True)
+    message_count = Column(Integer, default=0)
+    last_tool_call_index = Column(Integer)
+    pending_tool_call_ids = Column(Text)  # JSON list of tool_call ids without a response yet
+
+    thread = relationship("Thread", back_populates="thread_metadata")
+
+class BatchItem(Base):
+    __tablename__ = 'batch_items'
+
+    id = Column(Integer, primary_key=True)
+    batch_id = Column(String, index=True)
+    thread_id = Column(Integer, ForeignKey('threads.thread_id'))
+    status = Column(String)  # pending, completed or failed
+    error = Column(Text)
+    last_updated_date = Column(String)
+
+    __table_args__ = (UniqueConstraint('batch_id', 'thread_id', name='_batch_thread_uc'),)
+
+class SearchDocument(Base):
+    __tablename__ = 'search_documents'
+
+    # Row ids are shared with the `search_index` FTS5 table created in create_tables
+    id = Column(Integer, primary_key=True)
+    thread_id = Column(Integer, ForeignKey('threads.thread_id'), index=True)
+    kind = Column(String)  # message or memory_module
+    message_index = Column(Integer)
+    module_name = Column(String)
+
+class ThreadSummary(Base):
+    __tablename__ = 'thread_summaries'
+
+    summary_id = Column(Integer, primary_key=True)
+    thread_id = Column(Integer, ForeignKey('threads.thread_id'), index=True)
+    start_index = Column(Integer)  # Summarized messages are thread.messages[start_index:end_index]
+    end_index = Column(Integer)
+    summary = Column(Text)
+    model_name = Column(String)
+    creation_date = Column(String)
+
+class ArchivedThread(Base):
+    __tablename__ = 'archived_threads'
+
+    # Threads moved out of the hot database; the full bundle lives in archive_path
+    thread_id = Column(Integer, primary_key=True)
+    archive_path = Column(String)
+    month = Column(String)  # YYYY-MM of the thread's last update, one archive file per month
+    message_count = Column(Integer)
+    run_count = Column(Integer)
+    archived_date = Column(String)
+
 class MemoryModule(Base):
     __tablename__ = 'memory_modules'
 
     id = Column(Integer, primary_key=True)
     thread_id = Column(Integer, ForeignKey('threads.thread_id'))
     module_name = Column(String)
-    data = Column(Text)
+    data = Column(Text)  # NULL marks a module deleted in a fork that still inherits its parent's memory
 
     __table_args__ = (UniqueConstraint('thread_id', 'module_name', name='_thread_module_uc'),)
 
@@ -55,29 +151,75 @@ class Project(Base):
 
 
 class Database:
-    def __init__(self):
-        db_url = f"{settings.database_url}"
+    def __init__(self, db_url: Optional[str] = None, group_commit: bool = False, durable: bool = True, commit_interval: float = 0.005, max_batch_size: int = 64):
+        db_url = db_url or get_settings().database_url
         self.engine = create_async_engine(db_url, echo=False)
         self.SessionLocal = sessionmaker(
             class_=AsyncSession, expire_on_commit=False, autocommit=False, autoflush=False, bind=self.engine
         )
+        # With group_commit, hot-path writes are coalesced into shared transactions.
+        # durable=False makes them fire-and-forget; reads still see them (see get_async_session).
+        self.write_buffer = GroupCommitBuffer(self.SessionLocal, commit_interval, max_batch_size) if group_commit else None
+        self.durable = durable
+        self.tables_created = False
+        self.tables_lock: Optional[asyncio.Lock] = None
+
+    async def write(self, operation: Callable[[AsyncSession], Awaitable[Any]], durable: Optional[bool] = None) -> Any:
+        """Runs `operation(session)` and commits, through the group-commit buffer when enabled."""
+        await self.ensure_tables()
+        if self.write_buffer is None:
+            async with self.get_async_session() as session:
+                result = await operation(session)
+                await session.commit()
+                return result
+        return await self.write_buffer.submit(operation, self.durable if durable is None else durable)
+
+    async def flush(self):
+        if self.write_buffer is not None:
+            await self.write_buffer.flush()
 
     @asynccontextmanager
     async def get_async_session(self):
-        async with self.SessionLocal() as session:
-            try:
-                yield session
-            except Exception:
-                await session.rollback()
-                raise
-            finally:
-                await session.close()
+        await self.ensure_tables()
+        if self.write_buffer is not None and self.write_buffer.unacknowledged:
+            # Read-your-writes for fire-and-forget writes
+            await self.write_buffer.flush()
+        with tracing.span("db.session"):
+            async with self.SessionLocal() as session:
+                try:
+                    yield session
+                except Exception:
+                    await session.rollback()
+                    raise
+                finally:
+                    await session.close()
 
     async def create_tables(self):
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            # create_all skips indexes added to tables that already exist
+            for index in ThreadRun.__table__.indexes:
+                await conn.run_sync(index.create, checkfirst=True)
+            if self.engine.dialect.name == "sqlite":
+                await conn.execute(text(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(content, tokenize='porter unicode61')"
+                ))
+        self.tables_created = True
+
+    async def ensure_tables(self):
+        # Existing databases (e.g. the shipped main.db) predate the newer tables; create_tables is
+        # idempotent and runs once, before the first session or write of this Database
+        if self.tables_created:
+            return
+        if self.tables_lock is None:
+            self.tables_lock = asyncio.Lock()
+        async with self.tables_lock:
+            if not self.tables_created:
+                await self.create_tables()
 
     async def close(self):
+        if self.write_buffer is not None:
+            await self.write_buffer.close()
         await self.engine.dispose()
 
 
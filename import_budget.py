@@ -0,0 +1,76 @@
+"""Checks the cold import time of the core modules against a budget.
+
+Usage: python import_budget.py [--budget-ms 800] [--module message_thread_manager ...]
+
+Each module is imported in a fresh interpreter under `python -X importtime`. The check
+fails (exit code 1) if a module's cumulative import time exceeds the budget or if it
+pulls in a provider SDK that should only be loaded on the first model call.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+DEFAULT_MODULES = ["message_thread_manager", "session_manager", "working_memory_manager"]
+LAZY_MODULES = ["litellm", "openai", "anthropic", "streamlit"]
+
+
+def measure_import(module: str) -> Dict[str, int]:
+    """Returns the cumulative import time in microseconds of every module imported."""
+    scratch_dir = tempfile.mkdtemp(prefix="automata-import-")
+    env = {
+        **os.environ,
+        "DATABASE_URL": os.environ.get("DATABASE_URL", f"sqlite+aiosqlite:///{scratch_dir}/import.db"),
+        "WORKSPACE_DIR": os.path.join(scratch_dir, "workspace")
+    }
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr}")
+
+    # Lines look like "import time:       123 |       4567 |   package.sub"
+    timings = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        timings[name] = max(timings.get(name, 0), int(cumulative))
+    if os.path.isdir(os.path.join(scratch_dir, "workspace")):
+        print(f"warning: importing {module} created the workspace directory")
+    return timings
+
+
+def check(modules: List[str], budget_ms: float) -> List[str]:
+    failures = []
+    for module in modules:
+        timings = measure_import(module)
+        total_ms = timings.get(module, 0) / 1000
+        slowest = sorted(timings.items(), key=lambda item: item[1], reverse=True)[:5]
+        print(f"{module}: {total_ms:.0f} ms (slowest: {', '.join(f'{name} {us / 1000:.0f} ms' for name, us in slowest)})")
+        if total_ms > budget_ms:
+            failures.append(f"{module} took {total_ms:.0f} ms to import, budget is {budget_ms:.0f} ms")
+        eager = [name for name in timings if name.split(".")[0] in LAZY_MODULES]
+        if eager:
+            failures.append(f"{module} eagerly imports {', '.join(sorted(set(name.split('.')[0] for name in eager)))}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=800.0)
+    parser.add_argument("--module", action="append", dest="modules", help="Module to check (repeatable)")
+    args = parser.parse_args()
+
+    failures = check(args.modules or DEFAULT_MODULES, args.budget_ms)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,314 @@
-from typing import Union
-import litellm
-from litellm import acompletion
+from typing import Any, Dict, List, Optional, Union
 import os
-import json
-import openai
-from openai import OpenAIError
+import serialization
+import tracing
 import asyncio
 import logging
-from config import settings 
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from config import get_settings
 
-# Load environment variables
-OPENAI_API_KEY = settings.openai_api_key
-ANTHROPIC_API_KEY = settings.anthropic_api_key
-GROQ_API_KEY = settings.groq_api_key
+logger = logging.getLogger(__name__)
 
-# Export environment variables
-os.environ['OPENAI_API_KEY'] = OPENAI_API_KEY
-os.environ['ANTHROPIC_API_KEY'] = ANTHROPIC_API_KEY
-os.environ['GROQ_API_KEY'] = GROQ_API_KEY
-# os.environ['LITELLM_LOG'] = 'DEBUG'
+_litellm = None
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+
+def load_litellm():
+    """Imports litellm on first use; it takes seconds and most importers never call a model."""
+    global _litellm
+    if _litellm is None:
+        settings = get_settings()
+        # Export API keys for the provider SDKs, skipping unset ones
+        for name, value in (
+            ('OPENAI_API_KEY', settings.openai_api_key),
+            ('ANTHROPIC_API_KEY', settings.anthropic_api_key),
+            ('GROQ_API_KEY', settings.groq_api_key)
+        ):
+            if value is not None:
+                os.environ[name] = value
+        # os.environ['LITELLM_LOG'] = 'DEBUG'
+        import litellm
+        _litellm = litellm
+    return _litellm
+
+
+async def acompletion(**kwargs):
+    return await load_litellm().acompletion(**kwargs)
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def supports_prompt_caching(model_name: Union[str, "LLMRouter"]) -> bool:
+    if isinstance(model_name, LLMRouter):
+        return all(supports_prompt_caching(name) for name in model_name.model_names)
+    return "claude" in model_name.lower() or "anthropic" in model_name.lower()
+
+
+def _with_cache_control(message: Dict[str, Any]) -> Dict[str, Any]:
+    content = message.get("content")
+    if isinstance(content, str):
+        blocks = [{"type": "text", "text": content, "cache_control": CACHE_CONTROL}]
+    else:
+        blocks = [dict(block) for block in content]
+        blocks[-1]["cache_control"] = CACHE_CONTROL
+    return {**message, "content": blocks}
+
+
+def build_prompt_messages(system_message: Dict[str, Any], history: List[Dict[str, Any]], volatile_instructions: Optional[str] = None, model_name: str = "") -> List[Dict[str, Any]]:
+    # Stable prefix (system + history) first, volatile suffix (e.g. working memory) last,
+    # so consecutive iterations share the longest possible cached prefix.
+    messages = [system_message] + history
+
+    if supports_prompt_caching(model_name):
+        breakpoints = {0}
+        last_user_index = next((i for i in range(len(messages) - 1, 0, -1) if messages[i].get("role") == "user"), None)
+        if last_user_index is not None:
+            breakpoints.add(last_user_index)
+        messages = [
+            _with_cache_control(message) if i in breakpoints and message.get("content") else message
+            for i, message in enumerate(messages)
+        ]
+
+    if volatile_instructions:
+        # Anthropic hoists every system message into the system prompt, which would
+        # put the volatile part in front of the cached prefix, so send it as a user turn
+        role = "user" if supports_prompt_caching(model_name) else "system"
+        messages.append({"role": role, "content": volatile_instructions})
+
+    return messages
+
+
+def get_cache_usage(response: Any) -> Dict[str, int]:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return {"cache_read_tokens": 0, "cache_write_tokens": 0}
+    cache_read_tokens = getattr(usage, "cache_read_input_tokens", None) or 0
+    prompt_tokens_details = getattr(usage, "prompt_tokens_details", None)
+    if not cache_read_tokens and prompt_tokens_details is not None:
+        cache_read_tokens = getattr(prompt_tokens_details, "cached_tokens", None) or 0
+    cache_write_tokens = getattr(usage, "cache_creation_input_tokens", None) or 0
+    return {"cache_read_tokens": cache_read_tokens, "cache_write_tokens": cache_write_tokens}
+
+
+async def completion_once(messages, model_name, json_mode=False, temperature=0, max_tokens=None, tools=None, tool_choice="auto"):
+    api_call_params = {
+        "model": model_name,
+        "messages": messages,
+        "temperature": temperature,
+        "response_format": {"type": "json_object"} if json_mode else None,
+        **({"max_tokens": max_tokens} if max_tokens is not None else {})
+    }
+    if tools:
+        api_call_params["tools"] = tools
+        api_call_params["tool_choice"] = tool_choice
+
+    # Ensure the first message is from the user for Anthropic models
+    if supports_prompt_caching(model_name):
+        if messages[0]["role"] != "user":
+            api_call_params["messages"] = [{"role": "user", "content": "."}] + messages
+        api_call_params["extra_headers"] = {
+            "anthropic-beta": "prompt-caching-2024-07-31"
+        }
+        if tools:
+            # Cache the tool definitions together with the system prompt
+            api_call_params["tools"] = tools[:-1] + [{**tools[-1], "cache_control": CACHE_CONTROL}]
+    # Log the API request
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(f"Sending API request: {serialization.dumps(api_call_params)}")
+
+    response = await acompletion(**api_call_params)
+
+    # Log the API response
+    logger.info(f"Received API response: {response}")
+    cache_usage = get_cache_usage(response)
+    logger.info(f"Prompt cache usage for {model_name}: read={cache_usage['cache_read_tokens']} write={cache_usage['cache_write_tokens']}")
+
+    return response
+
+
+class EmptyJSONResponse(Exception):
+    """A json_mode call returned an empty JSON object."""
+
+
+@dataclass
+class Route:
+    model_name: str
+    weight: float = 1.0
+    latency_ewma: Optional[float] = None
+    error_ewma: float = 0.0
+    error_half_life: float = 30.0
+    error_updated: float = 0.0
+    cooldown_until: float = 0.0
+    latencies: deque = field(default_factory=lambda: deque(maxlen=200))
+
+    def error_rate(self) -> float:
+        # Errors fade with time, so a route demoted by a short outage is probed again
+        # instead of waiting for a success it can't get while ranked last
+        elapsed = time.monotonic() - self.error_updated
+        return self.error_ewma * 0.5 ** (elapsed / self.error_half_life)
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.cooldown_until and self.error_rate() < 0.5
+
+    def p95_latency(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def record_success(self, latency: float, alpha: float):
+        self.latencies.append(latency)
+        self.latency_ewma = latency if self.latency_ewma is None else alpha * latency + (1 - alpha) * self.latency_ewma
+        self.error_ewma = (1 - alpha) * self.error_rate()
+        self.error_updated = time.monotonic()
+
+    def record_failure(self, alpha: float, cooldown: float = 0.0):
+        self.error_ewma = alpha + (1 - alpha) * self.error_rate()
+        self.error_updated = time.monotonic()
+        if cooldown:
+            self.cooldown_until = time.monotonic() + cooldown
+
+
+def _error_status_code(error: Exception) -> Optional[int]:
+    status_code = getattr(error, "status_code", None)
+    return status_code if isinstance(status_code, int) else None
+
+
+def is_failover_error(error: Exception) -> bool:
+    litellm = load_litellm()
+    if isinstance(error, (litellm.exceptions.RateLimitError, litellm.exceptions.Timeout, litellm.exceptions.APIConnectionError, asyncio.TimeoutError, serialization.DecodeError, EmptyJSONResponse)):
+        return True
+    status_code = _error_status_code(error)
+    return status_code is not None and (status_code == 429 or status_code >= 500)
+
+
+class LLMRouter:
+    """Routes calls over several models/deployments with health tracking, hedging and failover.
+
+    Pass an instance as `model_name` to `make_llm_api_call` or `run_thread`.
+    """
+
+    def __init__(self, routes: List[Union[str, Route]], strategy: str = "ordered", hedge_after: Optional[float] = None, min_hedge_samples: int = 20, alpha: float = 0.2, rate_limit_cooldown: float = 30.0):
+        if not routes:
+            raise ValueError("LLMRouter needs at least one route")
+        if strategy not in ("ordered", "weighted"):
+            raise ValueError(f"Unknown routing strategy: {strategy}")
+        self.routes = [route if isinstance(route, Route) else Route(route) for route in routes]
+        self.strategy = strategy
+        self.hedge_after = hedge_after
+        self.min_hedge_samples = min_hedge_samples
+        self.alpha = alpha
+        self.rate_limit_cooldown = rate_limit_cooldown
+
+    @property
+    def model_names(self) -> List[str]:
+        return [route.model_name for route in self.routes]
+
+    def health(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "model_name": route.model_name,
+                "healthy": route.healthy,
+                "latency_ewma": route.latency_ewma,
+                "p95_latency": route.p95_latency(),
+                "error_ewma": route.error_rate(),
+                "cooldown_remaining": max(0.0, route.cooldown_until - time.monotonic())
+            } for route in self.routes
+        ]
+
+    def ranked_routes(self) -> List[Route]:
+        healthy = [route for route in self.routes if route.healthy]
+        unhealthy = [route for route in self.routes if not route.healthy]
+        if self.strategy == "weighted" and len(healthy) > 1:
+            weights = [route.weight * (1 - route.error_rate()) for route in healthy]
+            primary = random.choices(healthy, weights=weights)[0]
+            healthy = [primary] + [route for route in healthy if route is not primary]
+        # Unhealthy routes stay available as a last resort
+        return healthy + unhealthy
+
+    def _hedge_delay(self, route: Route) -> Optional[float]:
+        if self.hedge_after is not None:
+            return self.hedge_after
+        if len(route.latencies) >= self.min_hedge_samples:
+            return route.p95_latency()
+        return None
+
+    async def _call_route(self, route: Route, messages, json_mode, temperature, max_tokens, tools, tool_choice):
+        start = time.monotonic()
+        try:
+            with tracing.span("llm.route", {"model_name": route.model_name}):
+                response = await completion_once(messages, route.model_name, json_mode, temperature, max_tokens, tools, tool_choice)
+            if json_mode and not serialization.loads(response.choices[0].message['content']):
+                raise EmptyJSONResponse(f"Empty JSON object received from {route.model_name}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            cooldown = self.rate_limit_cooldown if isinstance(e, load_litellm().exceptions.RateLimitError) or _error_status_code(e) == 429 else 0.0
+            route.record_failure(self.alpha, cooldown)
+            logger.warning(f"Route {route.model_name} failed: {e}")
+            raise
+        route.record_success(time.monotonic() - start, self.alpha)
+        return response
+
+    async def _call_with_hedge(self, primary: Route, remaining: List[Route], request: tuple):
+        tasks = {asyncio.create_task(self._call_route(primary, *request))}
+        try:
+            delay = self._hedge_delay(primary)
+            if delay is not None and remaining:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    secondary = remaining.pop(0)
+                    logger.info(f"Hedging request from {primary.model_name} to {secondary.model_name} after {delay:.2f}s")
+                    tasks.add(asyncio.create_task(self._call_route(secondary, *request)))
+
+            last_error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def call(self, messages, json_mode=False, temperature=0, max_tokens=None, tools=None, tool_choice="auto"):
+        request = (messages, json_mode, temperature, max_tokens, tools, tool_choice)
+        remaining = self.ranked_routes()
+        last_error = None
+        while remaining:
+            primary = remaining.pop(0)
+            try:
+                return await self._call_with_hedge(primary, remaining, request)
+            except Exception as e:
+                if not is_failover_error(e):
+                    raise
+                last_error = e
+                logger.info(f"Failing over from {primary.model_name}: {e}")
+        raise Exception(f"Failed to make API call on all routes. Last error: {last_error}")
 
 
 async def make_llm_api_call(messages, model_name, json_mode=False, temperature=0, max_tokens=None, tools=None, tool_choice="auto"):
     # litellm.set_verbose = True
 
+    if isinstance(model_name, LLMRouter):
+        return await model_name.call(messages, json_mode, temperature, max_tokens, tools, tool_choice)
+
+    litellm = load_litellm()
+    from openai import OpenAIError
+
     async def attempt_api_call(api_call_func, max_attempts=3):
         for attempt in range(max_attempts):
             try:
-                response = await api_call_func()
+                with tracing.span("llm.attempt", {"attempt": attempt + 1, "model_name": model_name}):
+                    response = await api_call_func()
                 response_content = response.choices[0].message['content'] if json_mode else response
                 if json_mode:
-                    if not json.loads(response_content):
+                    if not serialization.loads(response_content):
                         logger.info(f"Invalid JSON received, retrying attempt {attempt + 1}")
                         continue
                     else:
@@ -48,39 +322,13 @@ async def make_llm_api_call(messages, model_name, json_mode=False, temperature=0
             except OpenAIError as e:
                 logger.info(f"API call failed, retrying attempt {attempt + 1}. Error: {e}")
                 await asyncio.sleep(5)
-            except json.JSONDecodeError:
+            except serialization.DecodeError:
                 logger.error(f"JSON decoding failed, retrying attempt {attempt + 1}")
                 await asyncio.sleep(5)
         raise Exception("Failed to make API call after multiple attempts.")
 
     async def api_call():
-        api_call_params = {
-            "model": model_name,
-            "messages": messages,
-            "temperature": temperature,
-            "response_format": {"type": "json_object"} if json_mode else None,
-            **({"max_tokens": max_tokens} if max_tokens is not None else {})
-        }
-        if tools:
-            api_call_params["tools"] = tools
-            api_call_params["tool_choice"] = tool_choice
-
-        # Ensure the first message is from the user for Anthropic models
-        if "claude" in model_name.lower() or "anthropic" in model_name.lower():
-            if messages[0]["role"] != "user":
-                api_call_params["messages"] = [{"role": "user", "content": "."}] + messages
-            api_call_params["extra_headers"] = {
-                "anthropic-beta": "prompt-caching-2024-07-31"
-            }
-        # Log the API request
-        logger.info(f"Sending API request: {json.dumps(api_call_params, indent=2)}")
-
-        response = await acompletion(**api_call_params)
-
-        # Log the API response
-        logger.info(f"Received API response: {response}")
-
-        return response
+        return await completion_once(messages, model_name, json_mode, temperature, max_tokens, tools, tool_choice)
     
     return await attempt_api_call(api_call)
 
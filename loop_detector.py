@@ -0,0 +1,169 @@
+import hashlib
+import logging
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import serialization
+
+CORRECTIVE_INSTRUCTION = (
+    "You are repeating yourself ({reason}). The last iterations did not make progress. "
+    "Do not repeat the same tool calls or answers; reconsider the approach, try something different, "
+    "or finish the task if it is done."
+)
+
+
+def short_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def canonical(value: Any) -> Any:
+    # Argument order must not make identical calls look different
+    if isinstance(value, dict):
+        return [[key, canonical(value[key])] for key in sorted(value)]
+    if isinstance(value, list):
+        return [canonical(item) for item in value]
+    return value
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over word 3-shingles; near-identical texts differ in only a few bits."""
+    words = re.findall(r"[a-z]+", text.lower())
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))]
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+@dataclass(slots=True)
+class IterationFingerprint:
+    tool_calls: Tuple[str, ...]
+    output: str
+    text_simhash: Optional[int]
+    memory: str
+
+    @property
+    def key(self) -> Tuple:
+        return (self.tool_calls, self.output, self.memory)
+
+
+class LoopDetector:
+    """Flags runaway agent loops from the messages each session iteration appended.
+
+    Detections, checked over the last `window` iterations:
+    - repeated_tool_call: the same tool call (name + arguments) `max_repeated_tool_calls` times
+    - repeated_output: `max_repeated_outputs` near-identical assistant texts (SimHash distance)
+    - no_progress: the iteration fingerprints (calls, outputs, working memory) repeat,
+      e.g. A A A or A B A B
+
+    Each detection applies the next entry of `policies` ("inject", "backoff" or "halt");
+    the last entry repeats once the list is exhausted.
+    """
+
+    def __init__(self, window: int = 8, max_repeated_tool_calls: int = 3, max_repeated_outputs: int = 3, max_simhash_distance: int = 3, policies: Tuple[str, ...] = ("inject", "backoff", "halt"), backoff_base: float = 2.0, backoff_max: float = 60.0):
+        for policy in policies:
+            if policy not in ("inject", "backoff", "halt"):
+                raise ValueError(f"Unknown loop policy: {policy}")
+        self.window = window
+        self.max_repeated_tool_calls = max_repeated_tool_calls
+        self.max_repeated_outputs = max_repeated_outputs
+        self.max_simhash_distance = max_simhash_distance
+        self.policies = tuple(policies)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.history: deque = deque(maxlen=window)
+        self.detections = 0
+        self.counts = {
+            "iterations": 0, "repeated_tool_call": 0, "repeated_output": 0, "no_progress": 0,
+            "inject": 0, "backoff": 0, "halt": 0
+        }
+
+    def fingerprint(self, messages: List[Dict[str, Any]], memory: Any = None) -> IterationFingerprint:
+        tool_calls = []
+        call_ids = set()
+        outputs = []
+        texts = []
+        for message in messages:
+            role = message.get("role")
+            for tool_call in message.get("tool_calls") or []:
+                call_ids.add(tool_call.get("id"))
+                function = tool_call.get("function", {})
+                try:
+                    arguments = canonical(serialization.loads(function.get("arguments") or "{}"))
+                except serialization.DecodeError:
+                    arguments = function.get("arguments")
+                tool_calls.append(short_hash(serialization.dumps([function.get("name"), arguments])))
+            content = message.get("content")
+            # Tool-call-only turns carry content None; that's no text, not the text "null"
+            if content is None:
+                content = ""
+            elif not isinstance(content, str):
+                content = serialization.dumps(content)
+            if role == "tool":
+                outputs.append(f"{message.get('name')}:{content}")
+                # Threads don't always keep the assistant message, so fall back to the result
+                if message.get("tool_call_id") not in call_ids:
+                    tool_calls.append(short_hash(serialization.dumps([message.get("name"), content])))
+            elif role == "assistant" and content.strip():
+                texts.append(content)
+        text = "\n".join(texts)
+        return IterationFingerprint(
+            tool_calls=tuple(tool_calls),
+            output=short_hash(" ".join(text.lower().split()) + "\x00" + "\x00".join(outputs)),
+            text_simhash=simhash(text) if text else None,
+            memory=short_hash(serialization.dumps(canonical(memory)))
+        )
+
+    def detect(self) -> Optional[str]:
+        history = list(self.history)
+        latest = history[-1]
+
+        call_counts: Dict[str, int] = {}
+        for fingerprint in history:
+            for call in set(fingerprint.tool_calls):
+                call_counts[call] = call_counts.get(call, 0) + 1
+        if any(call_counts.get(call, 0) >= self.max_repeated_tool_calls for call in latest.tool_calls):
+            return "repeated_tool_call"
+
+        if latest.text_simhash is not None:
+            similar = sum(
+                1 for fingerprint in history
+                if fingerprint.text_simhash is not None and bin(fingerprint.text_simhash ^ latest.text_simhash).count("1") <= self.max_simhash_distance
+            )
+            if similar >= self.max_repeated_outputs:
+                return "repeated_output"
+
+        keys = [fingerprint.key for fingerprint in history]
+        for period in range(1, len(keys) // 2 + 1):
+            # A single repeated state needs three occurrences, longer cycles two
+            repeats = 3 if period == 1 else 2
+            tail = keys[-repeats * period:]
+            if len(tail) == repeats * period and all(tail[i] == tail[i % period] for i in range(len(tail))):
+                return "no_progress"
+        return None
+
+    def observe(self, messages: List[Dict[str, Any]], memory: Any = None) -> Optional[Dict[str, Any]]:
+        """Records one iteration; returns the action to take ({"reason", "policy", ...}) or None."""
+        self.counts["iterations"] += 1
+        self.history.append(self.fingerprint(messages, memory))
+        reason = self.detect()
+        if reason is None:
+            return None
+
+        self.counts[reason] += 1
+        policy = self.policies[min(self.detections, len(self.policies) - 1)]
+        self.detections += 1
+        self.counts[policy] += 1
+        # Start a fresh window so the same repetition isn't reported again next iteration
+        self.history.clear()
+        logging.warning(f"Loop detected ({reason}), applying policy: {policy}")
+
+        action = {"reason": reason, "policy": policy}
+        if policy == "inject":
+            action["instruction"] = CORRECTIVE_INSTRUCTION.format(reason=reason.replace("_", " "))
+        elif policy == "backoff":
+            action["delay"] = min(self.backoff_max, self.backoff_base * 2 ** (self.counts["backoff"] - 1))
+        return action
@@ -0,0 +1,318 @@
+import itertools
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import serialization
+from db import Database, Thread, ThreadRun, ThreadMetadata, MemoryModule, LLMCall
+from llm import get_cache_usage
+from message_model import ThreadState
+from message_thread_manager import MessageThreadManager
+from search_index import SearchIndex
+from tools.tool import ToolResult
+from usage_ledger import UsageLedger
+
+# In-memory storage backend for ephemeral workloads (evals, tests, short-lived sub-agents).
+# InMemoryThreadManager / InMemoryWorkingMemory expose the same methods as the SQLAlchemy
+# backed MessageThreadManager / WorkingMemory, so `run_thread` and `Session` work unchanged.
+# Runs worth keeping can be copied into a SQLite database with `InMemoryStore.snapshot_to_sqlite`.
+
+@dataclass(slots=True)
+class StoredThread:
+    thread_id: int
+    creation_date: str
+    last_updated_date: str
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    state: ThreadState = field(default_factory=ThreadState)
+
+
+class InMemoryStore:
+    def __init__(self):
+        self.threads: Dict[int, StoredThread] = {}
+        self.runs: List[Dict[str, Any]] = []
+        # Module data is kept encoded, like the `memory_modules` table, so callers can't mutate stored state
+        self.modules: Dict[int, Dict[str, str]] = {}
+        self.llm_calls: List[LLMCall] = []
+        self.thread_ids = itertools.count(1)
+        self.run_ids = itertools.count(1)
+
+    def get_thread(self, thread_id: int) -> Optional[StoredThread]:
+        return self.threads.get(thread_id)
+
+    def require_thread(self, thread_id: int) -> StoredThread:
+        thread = self.threads.get(thread_id)
+        if thread is None:
+            raise ValueError(f"Thread with id {thread_id} not found")
+        return thread
+
+    async def snapshot_to_sqlite(self, db: Database, thread_ids: Optional[List[int]] = None) -> Dict[int, int]:
+        """Copies threads (default: all) with their runs, memory and LLM calls into `db`.
+
+        Returns a mapping from in-memory thread ids to the new database thread ids.
+        """
+        await db.create_tables()
+        selected = [self.threads[thread_id] for thread_id in thread_ids] if thread_ids is not None else list(self.threads.values())
+        search_index = SearchIndex()
+        thread_map = {}
+        run_map = {}
+
+        async with db.get_async_session() as session:
+            for thread in selected:
+                row = Thread(
+                    messages=serialization.dumps(thread.messages),
+                    creation_date=thread.creation_date,
+                    last_updated_date=thread.last_updated_date
+                )
+                session.add(row)
+                await session.flush()
+                thread_map[thread.thread_id] = row.thread_id
+                session.add(ThreadMetadata(
+                    thread_id=row.thread_id,
+                    message_count=thread.state.message_count,
+                    last_tool_call_index=thread.state.last_tool_call_index,
+                    pending_tool_call_ids=serialization.dumps(thread.state.pending_tool_call_ids)
+                ))
+                for module_name, data in self.modules.get(thread.thread_id, {}).items():
+                    session.add(MemoryModule(thread_id=row.thread_id, module_name=module_name, data=data))
+                    await search_index.index_module(session, row.thread_id, module_name, serialization.loads(data))
+                await search_index.reindex_thread(session, row.thread_id, thread.messages)
+
+            for run in self.runs:
+                if run["thread_id"] not in thread_map:
+                    continue
+                row = ThreadRun(
+                    thread_id=thread_map[run["thread_id"]],
+                    messages=serialization.dumps(run["messages"]),
+                    creation_date=run["creation_date"],
+                    working_memory=serialization.dumps(run["working_memory"]),
+                    status=run["status"]
+                )
+                session.add(row)
+                await session.flush()
+                run_map[run["run_id"]] = row.run_id
+
+            for call in self.llm_calls:
+                if call.thread_id not in thread_map:
+                    continue
+                session.add(LLMCall(
+                    thread_id=thread_map[call.thread_id],
+                    run_id=run_map.get(call.run_id),
+                    model_name=call.model_name,
+                    prompt_tokens=call.prompt_tokens,
+                    completion_tokens=call.completion_tokens,
+                    cache_read_tokens=call.cache_read_tokens,
+                    cache_write_tokens=call.cache_write_tokens,
+                    latency=call.latency,
+                    cost=call.cost,
+                    creation_date=call.creation_date,
+                    day=call.day
+                ))
+            await session.commit()
+
+        logging.info(f"Snapshotted {len(thread_map)} in-memory threads to {db.engine.url}")
+        return thread_map
+
+
+class InMemoryWorkingMemory:
+    def __init__(self, store: InMemoryStore):
+        self.store = store
+
+    async def add_or_update_module(self, thread_id: int, module_name: str, data: dict):
+        self.store.modules.setdefault(thread_id, {})[module_name] = serialization.dumps(data)
+
+    async def get_module(self, thread_id: int, module_name: str):
+        data = self.store.modules.get(thread_id, {}).get(module_name)
+        return serialization.loads(data) if data is not None else None
+
+    async def delete_module(self, thread_id: int, module_name: str):
+        self.store.modules.get(thread_id, {}).pop(module_name, None)
+
+    async def export_memory(self, thread_id: int):
+        return {module_name: serialization.loads(data) for module_name, data in self.store.modules.get(thread_id, {}).items()}
+
+    async def clear_memory(self, thread_id: int):
+        self.store.modules.pop(thread_id, None)
+
+    async def get_modules(self, thread_id: int):
+        return list(self.store.modules.get(thread_id, {}).keys())
+
+
+class InMemoryUsageLedger(UsageLedger):
+    def __init__(self, store: InMemoryStore):
+        super().__init__(None)
+        self.store = store
+
+    async def record_call(self, thread_id: int, model_name: str, response: Any, latency: float) -> LLMCall:
+        usage = getattr(response, "usage", None)
+        cache_usage = get_cache_usage(response)
+        now = datetime.now()
+        call = LLMCall(
+            call_id=len(self.store.llm_calls) + 1,
+            thread_id=thread_id,
+            model_name=getattr(response, "model", None) or model_name,
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+            cache_read_tokens=cache_usage["cache_read_tokens"],
+            cache_write_tokens=cache_usage["cache_write_tokens"],
+            latency=latency,
+            cost=self.compute_cost(response),
+            creation_date=now.isoformat(),
+            day=now.date().isoformat()
+        )
+        self.store.llm_calls.append(call)
+        return call
+
+    async def attach_to_run(self, session: Any, thread_id: int, run_id: int):
+        for call in self.store.llm_calls:
+            if call.thread_id == thread_id and call.run_id is None:
+                call.run_id = run_id
+
+    async def aggregate(self, group_by, **filters) -> List[Dict[str, Any]]:
+        groups: Dict[Any, List[LLMCall]] = {}
+        for call in self.store.llm_calls:
+            if all(value is None or getattr(call, column_name) == value for column_name, value in filters.items()):
+                groups.setdefault(getattr(call, group_by.key), []).append(call)
+        return [
+            {
+                group_by.key: key,
+                "calls": len(calls),
+                "prompt_tokens": sum(call.prompt_tokens for call in calls),
+                "completion_tokens": sum(call.completion_tokens for call in calls),
+                "cache_read_tokens": sum(call.cache_read_tokens for call in calls),
+                "cache_write_tokens": sum(call.cache_write_tokens for call in calls),
+                "cost": sum(call.cost for call in calls),
+                "avg_latency": sum(call.latency for call in calls) / len(calls)
+            } for key, calls in sorted(groups.items(), key=lambda item: (item[0] is None, item[0]))
+        ]
+
+    async def list_calls(self, thread_id: int) -> List[LLMCall]:
+        return [call for call in self.store.llm_calls if call.thread_id == thread_id]
+
+
+class InMemoryThreadManager(MessageThreadManager):
+    """MessageThreadManager over an InMemoryStore instead of a Database.
+
+    History compaction and the FTS search index need SQL and are not available; `search`
+    falls back to a case-insensitive substring scan.
+    """
+
+    def __init__(self, store: Optional[InMemoryStore] = None):
+        super().__init__(None)
+        self.store = store or InMemoryStore()
+        self.working_memory = InMemoryWorkingMemory(self.store)
+        self.usage_ledger = InMemoryUsageLedger(self.store)
+        self.search_index = None
+
+    async def create_thread(self) -> int:
+        creation_date = datetime.now().isoformat()
+        thread_id = next(self.store.thread_ids)
+        self.store.threads[thread_id] = StoredThread(thread_id, creation_date, creation_date)
+        return thread_id
+
+    async def fork_thread(self, thread_id: int, message_index: Optional[int] = None) -> int:
+        parent = self.store.require_thread(thread_id)
+        fork_index = parent.state.message_count if message_index is None else message_index
+        if not 0 <= fork_index <= parent.state.message_count:
+            raise ValueError(f"Message index {message_index} is out of range")
+        child_id = await self.create_thread()
+        child = self.store.threads[child_id]
+        child.messages = parent.messages[:fork_index]
+        child.state = ThreadState.from_messages(child.messages)
+        self.store.modules[child_id] = dict(self.store.modules.get(thread_id, {}))
+        return child_id
+
+    async def add_message(self, thread_id: int, message_data: Dict[str, Any], images: Optional[List[Dict[str, Any]]] = None):
+        thread = self.store.require_thread(thread_id)
+        # Round-trip like the SQL backend does, so stored messages are plain JSON values
+        message_data = serialization.loads(serialization.dumps({key: str(value) if isinstance(value, ToolResult) else value for key, value in message_data.items()}))
+        thread.state.validate_append(message_data)
+        thread.messages.append(message_data)
+        thread.state.apply(message_data)
+        thread.last_updated_date = datetime.now().isoformat()
+
+    def rewrite(self, thread: StoredThread, messages: List[Dict[str, Any]]):
+        thread.messages = messages
+        thread.state = ThreadState.from_messages(messages)
+        thread.last_updated_date = datetime.now().isoformat()
+
+    async def get_message(self, thread_id: int, message_index: int) -> Optional[Dict[str, Any]]:
+        thread = self.store.get_thread(thread_id)
+        if thread is None or message_index >= len(thread.messages):
+            return None
+        return thread.messages[message_index]
+
+    async def modify_message(self, thread_id: int, message_index: int, new_message_data: Dict[str, Any]):
+        thread = self.store.require_thread(thread_id)
+        if message_index >= len(thread.messages):
+            raise ValueError(f"Message index {message_index} is out of range")
+        messages = list(thread.messages)
+        messages[message_index] = new_message_data
+        self.rewrite(thread, messages)
+
+    async def remove_message(self, thread_id: int, message_index: int):
+        thread = self.store.require_thread(thread_id)
+        if message_index < len(thread.messages):
+            self.rewrite(thread, thread.messages[:message_index] + thread.messages[message_index + 1:])
+
+    async def list_messages(self, thread_id: int, hide_tool_msgs: bool = False) -> List[Dict[str, Any]]:
+        thread = self.store.get_thread(thread_id)
+        if thread is None:
+            return []
+        if hide_tool_msgs:
+            return [msg for msg in thread.messages if msg.get('role') != 'tool']
+        return list(thread.messages)
+
+    async def clean_up_thread(self, thread_id: int):
+        thread = self.store.get_thread(thread_id)
+        if thread is None or not thread.state.has_pending_tool_calls:
+            return False
+        messages = thread.messages[:thread.state.last_tool_call_index]
+        self.rewrite(thread, [m for m in messages if m.get('content') is not None])
+        return True
+
+    async def should_stop(self, thread_id: int) -> bool:
+        return any(run["thread_id"] == thread_id and run["status"] in ('stopping', 'cancelled', 'paused') for run in self.store.runs)
+
+    async def save_thread_run(self, thread_id: int, status: str = 'completed'):
+        thread = self.store.require_thread(thread_id)
+        run_id = next(self.store.run_ids)
+        self.store.runs.append({
+            "run_id": run_id,
+            "thread_id": thread_id,
+            "messages": list(thread.messages),
+            "creation_date": datetime.now().isoformat(),
+            "working_memory": await self.working_memory.export_memory(thread_id),
+            "status": status
+        })
+        await self.usage_ledger.attach_to_run(None, thread_id, run_id)
+
+    async def reindex_all_threads(self):
+        pass
+
+    async def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        needle = query.lower()
+        if not needle:
+            return []
+        text_of = SearchIndex().message_text
+        hits = []
+        for thread in self.store.threads.values():
+            for index, message in enumerate(thread.messages):
+                content = text_of(message)
+                position = content.lower().find(needle)
+                if position < 0:
+                    continue
+                snippet = content[max(0, position - 40):position] + f"[{content[position:position + len(needle)]}]" + content[position + len(needle):position + len(needle) + 40]
+                hits.append({"thread_id": thread.thread_id, "kind": "message", "message_index": index, "module_name": None, "snippet": snippet, "rank": 0.0})
+                if len(hits) >= limit:
+                    return hits
+        return hits
+
+    async def get_thread(self, thread_id: int) -> Optional[StoredThread]:
+        return self.store.get_thread(thread_id)
+
+    async def list_threads(self) -> List[Dict[str, Any]]:
+        threads = sorted(self.store.threads.values(), key=lambda thread: thread.creation_date, reverse=True)
+        return [{"thread_id": thread.thread_id, "creation_date": thread.creation_date} for thread in threads]
+
+    async def list_runs(self, thread_id: int) -> List[Dict[str, Any]]:
+        return [dict(run) for run in self.store.runs if run["thread_id"] == thread_id]
@@ -0,0 +1,123 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+@dataclass(slots=True)
+class ToolCall:
+    id: str
+    name: str
+    arguments: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "type": "function",
+            "function": {"name": self.name, "arguments": self.arguments}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ToolCall":
+        function = data.get("function", {})
+        return cls(id=data["id"], name=function.get("name"), arguments=function.get("arguments", "{}"))
+
+
+@dataclass(slots=True)
+class SystemMessage:
+    content: str
+    role: str = field(default="system", init=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"role": self.role, "content": self.content}
+
+
+@dataclass(slots=True)
+class UserMessage:
+    content: Any
+    role: str = field(default="user", init=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"role": self.role, "content": self.content}
+
+
+@dataclass(slots=True)
+class AssistantMessage:
+    content: Optional[str]
+    tool_calls: Optional[List[ToolCall]] = None
+    role: str = field(default="assistant", init=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        message = {"role": self.role, "content": self.content}
+        if self.tool_calls:
+            message["tool_calls"] = [tool_call.to_dict() for tool_call in self.tool_calls]
+        return message
+
+
+@dataclass(slots=True)
+class ToolMessage:
+    tool_call_id: str
+    name: str
+    content: str
+    role: str = field(default="tool", init=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "role": self.role,
+            "tool_call_id": self.tool_call_id,
+            "name": self.name,
+            "content": self.content
+        }
+
+
+Message = SystemMessage | UserMessage | AssistantMessage | ToolMessage
+
+
+def message_from_dict(data: Dict[str, Any]) -> Message:
+    role = data.get("role")
+    if role == "system":
+        return SystemMessage(data.get("content"))
+    if role == "user":
+        return UserMessage(data.get("content"))
+    if role == "assistant":
+        tool_calls = data.get("tool_calls")
+        return AssistantMessage(
+            data.get("content"),
+            [ToolCall.from_dict(tool_call) for tool_call in tool_calls] if tool_calls else None
+        )
+    if role == "tool":
+        return ToolMessage(data["tool_call_id"], data.get("name"), data.get("content"))
+    raise ValueError(f"Unknown message role: {role}")
+
+
+@dataclass(slots=True)
+class ThreadState:
+    """Cached bookkeeping for a thread's history, updated incrementally on append."""
+    message_count: int = 0
+    last_tool_call_index: Optional[int] = None
+    pending_tool_call_ids: List[str] = field(default_factory=list)
+
+    @property
+    def has_pending_tool_calls(self) -> bool:
+        return bool(self.pending_tool_call_ids)
+
+    def validate_append(self, message_data: Dict[str, Any]):
+        if message_data.get("role") == "user" and self.pending_tool_call_ids:
+            raise ValueError(f"Incomplete tool responses. Missing responses for tool calls: {self.pending_tool_call_ids}")
+
+    def apply(self, message_data: Dict[str, Any]):
+        role = message_data.get("role")
+        if role == "assistant" and "tool_calls" in message_data:
+            self.last_tool_call_index = self.message_count
+            self.pending_tool_call_ids = [tool_call["id"] for tool_call in message_data["tool_calls"]]
+        elif role == "tool" and self.pending_tool_call_ids:
+            tool_call_id = message_data.get("tool_call_id")
+            if tool_call_id in self.pending_tool_call_ids:
+                self.pending_tool_call_ids.remove(tool_call_id)
+            else:
+                self.pending_tool_call_ids.pop(0)
+        self.message_count += 1
+
+    @classmethod
+    def from_messages(cls, messages: List[Dict[str, Any]]) -> "ThreadState":
+        state = cls()
+        for message in messages:
+            state.apply(message)
+        return state
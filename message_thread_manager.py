@@ -1,60 +1,125 @@
-import json
+import serialization
+import tracing
 import logging
 import asyncio
+import time
 from typing import List, Dict, Any, Optional
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from db import Database, Thread, ThreadRun
+from db import Database, Thread, ThreadRun, ThreadMetadata, ThreadFork, ArchivedThread
 from tools.tool import Tool, ToolResult
-from llm import make_llm_api_call
+from llm import make_llm_api_call, build_prompt_messages
 from tools import ExampleTool 
 from working_memory_manager import WorkingMemory
+from usage_ledger import UsageLedger
+from search_index import SearchIndex
 from datetime import datetime
 from tools.tool_registry import ToolRegistry
+from tools.tool_prefetch import ToolPrefetcher
+from message_model import AssistantMessage, ThreadState, ToolCall, ToolMessage
+from thread_forks import resolve_messages, resolve_messages_blob, detach_for_rewrite
+from compaction import discard_summaries_after
 
 class MessageThreadManager:
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, compactor: Optional[Any] = None, archive: Optional[Any] = None):
         self.db = db
+        # Optional HistoryCompactor; when set, prompts use the summarized view of long threads
+        self.compactor = compactor
+        # Optional retention.ThreadArchive; archived threads are read from it and restored on the first write
+        self.archive = archive
         self.working_memory = WorkingMemory(db)
         self.tool_registry = ToolRegistry()
+        self.tool_prefetcher = ToolPrefetcher(self.tool_registry)
+        self.usage_ledger = UsageLedger(db)
+        self.search_index = SearchIndex()
+
+    async def close(self):
+        # Stops tool worker processes, hung ones included
+        self.tool_prefetcher.executor.shutdown()
+        if self.compactor is not None:
+            await self.compactor.drain()
 
     async def create_thread(self) -> int:
         async with self.db.get_async_session() as session:
             creation_date = datetime.now().isoformat()
             new_thread = Thread(
-                messages=json.dumps([]),
+                messages=serialization.dumps([]),
                 creation_date=creation_date,
                 last_updated_date=creation_date
             )
             session.add(new_thread)
+            await session.flush()
+            self._store_state(session, new_thread.thread_id, ThreadState(), None)
             await session.commit()
             return new_thread.thread_id
 
-    async def add_message(self, thread_id: int, message_data: Dict[str, Any], images: Optional[List[Dict[str, Any]]] = None):
+    async def load_thread(self, session: AsyncSession, thread_id: int, restore: bool = False) -> Optional[Thread]:
+        thread = await session.get(Thread, thread_id)
+        if thread is None and self.archive is not None:
+            thread = await (self.archive.restore if restore else self.archive.read_thread)(session, thread_id)
+        return thread
+
+    async def _load_state(self, session: AsyncSession, thread: Thread) -> tuple[ThreadState, Optional[ThreadMetadata]]:
+        metadata = await session.get(ThreadMetadata, thread.thread_id)
+        if metadata is None:
+            # Threads created before metadata existed are scanned once and cached from then on
+            return ThreadState.from_messages(await resolve_messages(session, thread)), None
+        state = ThreadState(
+            message_count=metadata.message_count,
+            last_tool_call_index=metadata.last_tool_call_index,
+            pending_tool_call_ids=serialization.loads(metadata.pending_tool_call_ids or "[]")
+        )
+        return state, metadata
+
+    def _store_state(self, session: AsyncSession, thread_id: int, state: ThreadState, metadata: Optional[ThreadMetadata]):
+        if metadata is None:
+            metadata = ThreadMetadata(thread_id=thread_id)
+            session.add(metadata)
+        metadata.message_count = state.message_count
+        metadata.last_tool_call_index = state.last_tool_call_index
+        metadata.pending_tool_call_ids = serialization.dumps(state.pending_tool_call_ids)
+
+    async def fork_thread(self, thread_id: int, message_index: Optional[int] = None) -> int:
+        """Creates a branch sharing the first `message_index` messages (default: all) and the working memory of the thread."""
         async with self.db.get_async_session() as session:
-            thread = await session.get(Thread, thread_id)
-            if not thread:
+            parent = await self.load_thread(session, thread_id, restore=True)
+            if not parent:
                 raise ValueError(f"Thread with id {thread_id} not found")
 
-            try:
-                messages = json.loads(thread.messages)
-                
-                # If we're adding a user message, perform checks
-                if message_data['role'] == 'user':
-                    # Find the last assistant message with tool calls
-                    last_assistant_index = next((i for i in reversed(range(len(messages))) if messages[i]['role'] == 'assistant' and 'tool_calls' in messages[i]), None)
-                    
-                    if last_assistant_index is not None:
-                        tool_call_count = len(messages[last_assistant_index]['tool_calls'])
-                        tool_response_count = sum(1 for msg in messages[last_assistant_index+1:] if msg['role'] == 'tool')
-                        
-                        if tool_call_count != tool_response_count:
-                            raise ValueError(f"Incomplete tool responses. Expected {tool_call_count}, but got {tool_response_count}")
+            parent_state, _ = await self._load_state(session, parent)
+            fork_index = parent_state.message_count if message_index is None else message_index
+            if not 0 <= fork_index <= parent_state.message_count:
+                raise ValueError(f"Message index {message_index} is out of range")
 
-                # Convert ToolResult objects to strings
-                for key, value in message_data.items():
-                    if isinstance(value, ToolResult):
-                        message_data[key] = str(value)
+            creation_date = datetime.now().isoformat()
+            child = Thread(
+                messages=serialization.dumps([]),
+                creation_date=creation_date,
+                last_updated_date=creation_date
+            )
+            session.add(child)
+            await session.flush()
+            session.add(ThreadFork(
+                thread_id=child.thread_id,
+                parent_thread_id=thread_id,
+                fork_index=fork_index,
+                inherits_memory=1,
+                creation_date=creation_date
+            ))
+
+            if fork_index == parent_state.message_count:
+                state = ThreadState(parent_state.message_count, parent_state.last_tool_call_index, list(parent_state.pending_tool_call_ids))
+            else:
+                state = ThreadState.from_messages((await resolve_messages(session, parent))[:fork_index])
+            self._store_state(session, child.thread_id, state, None)
+            await session.commit()
+            return child.thread_id
+
+    async def add_message(self, thread_id: int, message_data: Dict[str, Any], images: Optional[List[Dict[str, Any]]] = None):
+        # Convert ToolResult objects to strings
+        for key, value in message_data.items():
+            if isinstance(value, ToolResult):
+                message_data[key] = str(value)
 
 #                 # Process images if present
 #                 if images:
@@ -71,35 +136,60 @@ class MessageThreadManager:
                     
 #                     message_data['content'] = content
 
-                messages.append(message_data)
-                thread.messages = json.dumps(messages)
-                thread.last_updated_date = datetime.now().isoformat()
-                await session.commit()
-            except Exception as e:
-                await session.rollback()
-                raise e
+        async def write(session: AsyncSession):
+            thread = await self.load_thread(session, thread_id, restore=True)
+            if not thread:
+                raise ValueError(f"Thread with id {thread_id} not found")
+            await self.append_to_thread(session, thread, message_data)
+
+        await self.db.write(write)
+
+    async def append_to_thread(self, session: AsyncSession, thread: Thread, message_data: Dict[str, Any]):
+        state, metadata = await self._load_state(session, thread)
+
+        # If we're adding a user message, make sure every tool call has a response
+        state.validate_append(message_data)
+
+        # Append to the stored JSON array without decoding the history
+        with tracing.span("append_message", {"role": message_data.get('role')}) as append_span:
+            encoded_message = serialization.dumps(message_data)
+            # A fork's own array can be empty while its full history isn't
+            stored = thread.messages.rstrip()[:-1].rstrip()
+            if stored == "[":
+                thread.messages = f"[{encoded_message}]"
+            else:
+                thread.messages = f"{stored},{encoded_message}]"
+            append_span.set_attribute("bytes_serialized", len(encoded_message))
+        await self.search_index.index_message(session, thread.thread_id, state.message_count, message_data)
+        state.apply(message_data)
+        self._store_state(session, thread.thread_id, state, metadata)
+        thread.last_updated_date = datetime.now().isoformat()
 
     async def get_message(self, thread_id: int, message_index: int) -> Optional[Dict[str, Any]]:
         async with self.db.get_async_session() as session:
-            thread = await session.get(Thread, thread_id)
+            thread = await self.load_thread(session, thread_id)
             if not thread:
                 return None
-            messages = json.loads(thread.messages)
+            messages = await resolve_messages(session, thread)
             if message_index < len(messages):
                 return messages[message_index]
             return None
 
     async def modify_message(self, thread_id: int, message_index: int, new_message_data: Dict[str, Any]):
         async with self.db.get_async_session() as session:
-            thread = await session.get(Thread, thread_id)
+            thread = await self.load_thread(session, thread_id, restore=True)
             if not thread:
                 raise ValueError(f"Thread with id {thread_id} not found")
 
             try:
-                messages = json.loads(thread.messages)
+                messages = await detach_for_rewrite(session, thread, message_index)
                 if message_index < len(messages):
                     messages[message_index] = new_message_data
-                    thread.messages = json.dumps(messages)
+                    thread.messages = serialization.dumps(messages)
+                    await discard_summaries_after(session, thread_id, message_index)
+                    metadata = await session.get(ThreadMetadata, thread_id)
+                    self._store_state(session, thread_id, ThreadState.from_messages(messages), metadata)
+                    await self.search_index.reindex_thread(session, thread_id, messages)
                     thread.last_updated_date = datetime.now().isoformat()
                     await session.commit()
                 else:
@@ -110,15 +200,19 @@ class MessageThreadManager:
 
     async def remove_message(self, thread_id: int, message_index: int):
         async with self.db.get_async_session() as session:
-            thread = await session.get(Thread, thread_id)
+            thread = await self.load_thread(session, thread_id, restore=True)
             if not thread:
                 raise ValueError(f"Thread with id {thread_id} not found")
 
             try:
-                messages = json.loads(thread.messages)
+                messages = await detach_for_rewrite(session, thread, message_index)
                 if message_index < len(messages):
                     del messages[message_index]
-                    thread.messages = json.dumps(messages)
+                    thread.messages = serialization.dumps(messages)
+                    await discard_summaries_after(session, thread_id, message_index)
+                    metadata = await session.get(ThreadMetadata, thread_id)
+                    self._store_state(session, thread_id, ThreadState.from_messages(messages), metadata)
+                    await self.search_index.reindex_thread(session, thread_id, messages)
                     thread.last_updated_date = datetime.now().isoformat()
                     await session.commit()
             except Exception as e:
@@ -127,135 +221,152 @@ class MessageThreadManager:
 
     async def list_messages(self, thread_id: int, hide_tool_msgs: bool = False) -> List[Dict[str, Any]]:
         async with self.db.get_async_session() as session:
-            thread = await session.get(Thread, thread_id)
+            thread = await self.load_thread(session, thread_id)
             if not thread:
                 return []
-            messages = json.loads(thread.messages)
+            messages = await resolve_messages(session, thread)
             if hide_tool_msgs:
                 return [msg for msg in messages if msg.get('role') != 'tool']
             return messages
         
     async def clean_up_thread(self, thread_id: int):
-        messages = await self.list_messages(thread_id)
-        last_assistant_message = next((m for m in reversed(messages) if m['role'] == 'assistant' and 'tool_calls' in m), None)
-        
-        if last_assistant_message:
-            tool_calls = last_assistant_message.get('tool_calls', [])
-            tool_responses = [m for m in messages[messages.index(last_assistant_message)+1:] if m['role'] == 'tool']
-            
-            if len(tool_calls) != len(tool_responses):
-                # Remove the incomplete assistant message and all subsequent messages
-                messages = messages[:messages.index(last_assistant_message)]
-                
-                # Check for null content in messages
-                messages = [m for m in messages if m.get('content') is not None]
-                
-                async with self.db.get_async_session() as session:
-                    thread = await session.get(Thread, thread_id)
-                    if thread:
-                        thread.messages = json.dumps(messages)
-                        await session.commit()
-                
-                return True
-        return False
+        async with self.db.get_async_session() as session:
+            thread = await self.load_thread(session, thread_id, restore=True)
+            if not thread:
+                return False
+
+            state, metadata = await self._load_state(session, thread)
+            if not state.has_pending_tool_calls:
+                if metadata is None:
+                    self._store_state(session, thread_id, state, metadata)
+                # Also keeps a thread that load_thread just restored from the archive
+                await session.commit()
+                return False
+
+            # Remove the incomplete assistant message and all subsequent messages,
+            # and messages with null content; the history changes from the first of those on
+            messages = (await resolve_messages(session, thread))[:state.last_tool_call_index]
+            dropped = [index for index, m in enumerate(messages) if m.get('content') is None]
+            first_changed = min(dropped, default=state.last_tool_call_index)
+            messages = (await detach_for_rewrite(session, thread, first_changed))[:state.last_tool_call_index]
+            messages = [m for m in messages if m.get('content') is not None]
+
+            thread.messages = serialization.dumps(messages)
+            await discard_summaries_after(session, thread_id, first_changed)
+            self._store_state(session, thread_id, ThreadState.from_messages(messages), metadata)
+            await self.search_index.reindex_thread(session, thread_id, messages)
+            await session.commit()
+            return True
         
     async def run_thread(self, thread_id: int, system_message: Dict[str, Any], model_name: Any, json_mode: bool = False, temperature: int = 0, max_tokens: Optional[Any] = None, tools: Optional[List[str]] = None, tool_choice: str = "auto", additional_instructions: Optional[str] = None) -> Any:
-        if await self.should_stop(thread_id):
-            return {"status": "stopped", "message": "Session cancelled"}
+        with tracing.span("run_thread", {"thread_id": thread_id, "model_name": str(model_name)}):
+            with tracing.span("should_stop"):
+                if await self.should_stop(thread_id):
+                    return {"status": "stopped", "message": "Session cancelled"}
 
-        # Clean up incomplete tool calls before processing
-        await self.clean_up_thread(thread_id)
+            # Clean up incomplete tool calls before processing
+            with tracing.span("clean_up_thread"):
+                await self.clean_up_thread(thread_id)
 
-        messages = await self.list_messages(thread_id)
-        temp_messages = [system_message] + messages
+            with tracing.span("list_messages"):
+                messages = await self.list_messages(thread_id)
 
-        if additional_instructions:
-            temp_messages.append({
-                "role": "system",
-                "content": f"{additional_instructions}"
-            })
+            if self.compactor is not None:
+                with tracing.span("compacted_view"):
+                    messages = await self.compactor.compacted_view(thread_id, messages)
 
-        try:
-            if tools is None:
-                tools = list(self.tool_registry.get_all_tools().values())
-            
-            # Format tools correctly
-            formatted_tools = []
-            for tool in tools:
-                if isinstance(tool, Tool):
-                    formatted_tools.extend(tool.schema())
-                elif isinstance(tool, dict):
-                    formatted_tools.append(tool)
-                else:
-                    raise ValueError(f"Invalid tool type: {type(tool)}")
+            try:
+                with tracing.span("prompt_assembly", {"message_count": len(messages)}):
+                    temp_messages = build_prompt_messages(system_message, messages, additional_instructions, model_name)
 
-            response = await make_llm_api_call(temp_messages, model_name, json_mode, temperature, max_tokens, formatted_tools, tool_choice)
-        except Exception as e:
-            logging.error(f"Error in API call: {str(e)}")
-            return {"status": "error", "message": f"API call failed: {str(e)}"}
+                    if tools is None:
+                        tools = list(self.tool_registry.get_all_tools().values())
+
+                    # Format tools correctly
+                    formatted_tools = []
+                    for tool in tools:
+                        if isinstance(tool, Tool):
+                            formatted_tools.extend(tool.schema())
+                        elif isinstance(tool, dict):
+                            formatted_tools.append(tool)
+                        else:
+                            raise ValueError(f"Invalid tool type: {type(tool)}")
+
+                with tracing.span("llm_call") as llm_span:
+                    llm_start = time.perf_counter()
+                    response = await make_llm_api_call(temp_messages, model_name, json_mode, temperature, max_tokens, formatted_tools, tool_choice)
+                    llm_latency = time.perf_counter() - llm_start
+                    usage = getattr(response, "usage", None)
+                    if usage is not None:
+                        llm_span.set_attribute("prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0)
+                        llm_span.set_attribute("completion_tokens", getattr(usage, "completion_tokens", 0) or 0)
+            except Exception as e:
+                logging.error(f"Error in API call: {str(e)}")
+                return {"status": "error", "message": f"API call failed: {str(e)}"}
 
-        if tools is None:
-            response_content = response.choices[0].message['content']
-            await self.add_message(thread_id, {"role": "assistant", "content": response_content})
-        else:
             try:
-                response_message = response.choices[0].message
-                tool_calls = response_message.get('tool_calls', [])
-                
-                if tool_calls:
-                    assistant_message = {
-                        "role": "assistant",
-                        "content": response_message.get('content') or "",
-                        "tool_calls": [
-                            {
-                                "id": tool_call.id,
-                                "type": "function",
-                                "function": {
-                                    "name": tool_call.function.name,
-                                    "arguments": tool_call.function.arguments
-                                }
-                            } for tool_call in tool_calls
-                        ]
-                    }
-                    # await self.add_message(thread_id, assistant_message)
-
-                    for tool_call in tool_calls:
-                        function_name = tool_call.function.name
-                        tool_instance = self.tool_registry.get_tool(function_name)
-                        function_to_call = getattr(tool_instance, function_name)
-                        function_args = json.loads(tool_call.function.arguments)
-                        print(f"Function arguments for {function_name}:", function_args)
-                        try:
-                            function_response = await function_to_call(**function_args)
-                                                        
-                        except Exception as e:
-                            error_message = f"Error in {function_name}: {str(e)}"
-                            function_response = ToolResult(success=False, output=error_message)
-                        
-                        tool_message = {
-                            "role": "tool",
-                            "tool_call_id": tool_call.id,
-                            "name": function_name,
-                            "content": str(function_response),
-                        }
-                        await self.add_message(thread_id, tool_message)
-                        
-                    
-                    if await self.should_stop(thread_id):
-                        return {"status": "stopped", "message": "Session cancelled after tool execution"}
+                await self.usage_ledger.record_call(thread_id, str(model_name), response, llm_latency)
+            except Exception as e:
+                logging.error(f"Failed to record LLM usage: {str(e)}")
 
-            
-            except AttributeError as e:
-                logging.error(f"AttributeError: {e}")
+            if tools is None:
                 response_content = response.choices[0].message['content']
-                await self.add_message(thread_id, {"role": "assistant", "content": response_content or ""})
+                await self.add_message(thread_id, AssistantMessage(response_content).to_dict())
+            else:
+                try:
+                    response_message = response.choices[0].message
+                    tool_calls = response_message.get('tool_calls', [])
+
+                    if tool_calls:
+                        assistant_message = AssistantMessage(
+                            response_message.get('content') or "",
+                            [ToolCall(tool_call.id, tool_call.function.name, tool_call.function.arguments) for tool_call in tool_calls]
+                        ).to_dict()
+                        # await self.add_message(thread_id, assistant_message)
+
+                        parsed_calls = [(tool_call.function.name, serialization.loads(tool_call.function.arguments)) for tool_call in tool_calls]
+                        try:
+                            # Start independent read-only calls right away; they run while earlier calls execute
+                            self.tool_prefetcher.prefetch_calls(thread_id, parsed_calls)
+
+                            for tool_call, (function_name, function_args) in zip(tool_calls, parsed_calls):
+                                with tracing.span(f"tool.{function_name}") as tool_span:
+                                    print(f"Function arguments for {function_name}:", function_args)
+                                    try:
+                                        function_response = await self.tool_prefetcher.execute(thread_id, function_name, function_args)
+
+                                    except Exception as e:
+                                        error_message = f"Error in {function_name}: {str(e)}"
+                                        function_response = ToolResult(success=False, output=error_message)
+                                        tool_span.record_exception(e)
+
+                                tool_message = ToolMessage(tool_call.id, function_name, str(function_response))
+                                await self.add_message(thread_id, tool_message.to_dict())
+                        finally:
+                            # Memoized reads only live for this iteration
+                            self.tool_prefetcher.clear(thread_id)
+
+                        with tracing.span("should_stop"):
+                            if await self.should_stop(thread_id):
+                                return {"status": "stopped", "message": "Session cancelled after tool execution"}
 
-        if await self.should_stop(thread_id):
-            return {"status": "stopped", "message": "Session cancelled"}
+                except AttributeError as e:
+                    logging.error(f"AttributeError: {e}")
+                    response_content = response.choices[0].message['content']
+                    await self.add_message(thread_id, AssistantMessage(response_content or "").to_dict())
 
-        await self.save_thread_run(thread_id)
+            with tracing.span("should_stop"):
+                if await self.should_stop(thread_id):
+                    return {"status": "stopped", "message": "Session cancelled"}
 
-        return response
+            with tracing.span("save_thread_run"):
+                await self.save_thread_run(thread_id)
+
+            if self.compactor is not None:
+                # Summarization runs in the background, the next iteration picks it up when ready
+                self.compactor.schedule(thread_id)
+
+            return response
 
     async def should_stop(self, thread_id: int) -> bool:
         async with self.db.get_async_session() as session:
@@ -263,29 +374,71 @@ class MessageThreadManager:
             result = await session.execute(stmt)
             return result.scalar_one_or_none() is not None
 
-    async def save_thread_run(self, thread_id: int):
-        async with self.db.get_async_session() as session:
-            thread = await session.get(Thread, thread_id)
+    async def save_thread_run(self, thread_id: int, status: str = 'completed'):
+        async def write(session: AsyncSession):
+            thread = await self.load_thread(session, thread_id, restore=True)
             if not thread:
                 raise ValueError(f"Thread with id {thread_id} not found")
 
-            messages = json.loads(thread.messages)
-            working_memory_state = await self.working_memory.export_memory(thread_id)
+            working_memory_state = await self.working_memory.effective_modules(session, thread_id)
             creation_date = datetime.now().isoformat()
             
             new_thread_run = ThreadRun(
                 thread_id=thread_id,
-                messages=json.dumps(messages),
+                messages=await resolve_messages_blob(session, thread),
                 creation_date=creation_date,
-                working_memory=json.dumps(working_memory_state),
-                status='completed'
+                working_memory=serialization.dumps(working_memory_state),
+                status=status
             )
             session.add(new_thread_run)
+            await session.flush()
+            await self.usage_ledger.attach_to_run(session, thread_id, new_thread_run.run_id)
+
+        await self.db.write(write)
+
+    async def reindex_all_threads(self):
+        # Backfills the search index for threads created before it existed
+        async with self.db.get_async_session() as session:
+            threads = (await session.execute(select(Thread))).scalars().all()
+            for thread in threads:
+                await self.search_index.reindex_thread(session, thread.thread_id, await resolve_messages(session, thread))
             await session.commit()
 
+    async def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        async with self.db.get_async_session() as session:
+            return await self.search_index.search(session, query, limit)
+
     async def get_thread(self, thread_id: int) -> Optional[Thread]:
         async with self.db.get_async_session() as session:
-            return await session.get(Thread, thread_id)
+            return await self.load_thread(session, thread_id)
+
+    async def list_threads(self) -> List[Dict[str, Any]]:
+        async with self.db.get_async_session() as session:
+            result = await session.execute(select(Thread.thread_id, Thread.creation_date).order_by(Thread.creation_date.desc()))
+            threads = [dict(row._mapping) for row in result]
+            if self.archive is not None:
+                # Archived threads are older than any hot thread; they're restored when opened for writing
+                result = await session.execute(select(ArchivedThread.thread_id).order_by(ArchivedThread.thread_id.desc()))
+                threads += [{"thread_id": thread_id, "creation_date": None, "archived": True} for thread_id in result.scalars().all()]
+            return threads
+
+    async def list_runs(self, thread_id: int) -> List[Dict[str, Any]]:
+        async with self.db.get_async_session() as session:
+            result = await session.execute(select(ThreadRun).where(ThreadRun.thread_id == thread_id).order_by(ThreadRun.run_id))
+            runs = [
+                {
+                    "run_id": run.run_id,
+                    "thread_id": run.thread_id,
+                    "messages": run.messages,
+                    "creation_date": run.creation_date,
+                    "working_memory": run.working_memory,
+                    "status": run.status
+                } for run in result.scalars().all()
+            ]
+            if not runs and self.archive is not None:
+                bundle = await self.archive.read(session, thread_id)
+                runs = bundle["runs"] if bundle else []
+        return [{**run, "messages": serialization.loads(run["messages"]), "working_memory": serialization.loads(run["working_memory"] or "{}")} for run in runs]
 
 if __name__ == "__main__":
     pass
\ No newline at end of file
@@ -0,0 +1,342 @@
+"""Retention policies and archival for thread_runs and old threads.
+
+Usage: python retention.py [--keep-last-runs 20] [--keep-runs-days 7] [--final-run-only-days 1]
+                           [--archive-days 30] [--archive-dir DIR] [--batch-size 50] [--dry-run]
+
+Pruning deletes old completed run snapshots; archiving moves idle threads into per-month,
+zlib-compressed SQLite files. Both work in small batches, one short transaction each, so
+running sessions are never blocked for long. Archived threads stay readable through
+`MessageThreadManager` (`Session` and the UI pass `archive=ThreadArchive(db)`), and are
+restored into the hot database on their first write. Archive files default to an
+`archive/` directory next to the SQLite database file.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sqlite3
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select, delete, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+import serialization
+from config import get_settings
+from db import Database, Thread, ThreadRun, ThreadMetadata, ThreadFork, ThreadSummary, LLMCall, MemoryModule, SearchDocument, ArchivedThread
+from message_model import ThreadState
+from search_index import SearchIndex
+from thread_forks import resolve_messages
+from working_memory_manager import WorkingMemory
+
+# Run statuses that `should_stop` looks for; those runs are never pruned
+CONTROL_STATUSES = ('stopping', 'cancelled', 'paused')
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    keep_last_runs: Optional[int] = 20
+    keep_runs_newer_than: Optional[timedelta] = timedelta(days=7)
+    # Threads idle this long whose latest run completed keep only that run
+    final_run_only_after: Optional[timedelta] = timedelta(days=1)
+    archive_after: Optional[timedelta] = timedelta(days=30)
+
+    def runs_to_delete(self, runs: List[ThreadRun], idle_since: str, now: datetime) -> List[int]:
+        """Returns the run ids to prune from one thread's runs (ordered oldest first)."""
+        if not runs:
+            return []
+        latest = runs[-1]
+        final_only = (
+            self.final_run_only_after is not None
+            and latest.status == 'completed'
+            and idle_since < (now - self.final_run_only_after).isoformat()
+        )
+        newer_than = (now - self.keep_runs_newer_than).isoformat() if self.keep_runs_newer_than is not None else None
+        run_ids = []
+        for position, run in enumerate(reversed(runs)):
+            if run is latest or run.status in CONTROL_STATUSES:
+                continue
+            if not final_only:
+                if self.keep_last_runs is None and newer_than is None:
+                    continue
+                if self.keep_last_runs is not None and position < self.keep_last_runs:
+                    continue
+                if newer_than is not None and (run.creation_date or "") >= newer_than:
+                    continue
+            run_ids.append(run.run_id)
+        return run_ids
+
+
+def default_archive_dir() -> str:
+    # Keep the archive files next to the SQLite database file (e.g. main.db -> archive/)
+    database_url = get_settings().database_url
+    database_path = database_url.split(":///", 1)[-1] if ":///" in database_url else ""
+    return os.path.join(os.path.dirname(os.path.abspath(database_path)) if database_path else os.getcwd(), "archive")
+
+
+class ThreadArchive:
+    """Per-month archive files holding one compressed bundle per thread.
+
+    The hot database keeps an `archived_threads` row per archived thread pointing at its file.
+    """
+
+    def __init__(self, db: Database, archive_dir: Optional[str] = None, compression_level: int = 6):
+        self.db = db
+        # Paths are stored in archived_threads, so they must not depend on the working directory
+        self.archive_dir = os.path.abspath(archive_dir or default_archive_dir())
+        self.compression_level = compression_level
+        self.working_memory = WorkingMemory(db)
+        self.search_index = SearchIndex()
+
+    def path_for(self, month: str) -> str:
+        return os.path.join(self.archive_dir, f"threads-{month}.sqlite")
+
+    def resolve_path(self, archive_path: str) -> str:
+        # Entries recorded with a relative path are looked up in this archive's directory
+        return archive_path if os.path.isabs(archive_path) else os.path.join(self.archive_dir, os.path.basename(archive_path))
+
+    def connect(self, path: str) -> sqlite3.Connection:
+        connection = sqlite3.connect(path)
+        connection.execute("CREATE TABLE IF NOT EXISTS archived_threads (thread_id INTEGER PRIMARY KEY, archived_date TEXT, payload BLOB)")
+        return connection
+
+    def write_bundles(self, path: str, bundles: Dict[int, Dict[str, Any]]):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        archived_date = datetime.now().isoformat()
+        rows = [
+            (thread_id, archived_date, zlib.compress(serialization.dumps(bundle).encode("utf-8"), self.compression_level))
+            for thread_id, bundle in bundles.items()
+        ]
+        with self.connect(path) as connection:
+            connection.executemany("INSERT OR REPLACE INTO archived_threads VALUES (?, ?, ?)", rows)
+        connection.close()
+
+    def read_bundle(self, path: str, thread_id: int) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(path):
+            return None
+        connection = self.connect(path)
+        try:
+            row = connection.execute("SELECT payload FROM archived_threads WHERE thread_id = ?", (thread_id,)).fetchone()
+        finally:
+            connection.close()
+        return serialization.loads(zlib.decompress(row[0]).decode("utf-8")) if row else None
+
+    async def build_bundle(self, session: AsyncSession, thread: Thread) -> Dict[str, Any]:
+        # Forks are stored materialized (full history and effective memory), so bundles never depend on other threads
+        runs = (await session.execute(select(ThreadRun).where(ThreadRun.thread_id == thread.thread_id).order_by(ThreadRun.run_id))).scalars().all()
+        calls = (await session.execute(select(LLMCall).where(LLMCall.thread_id == thread.thread_id))).scalars().all()
+        summaries = (await session.execute(select(ThreadSummary).where(ThreadSummary.thread_id == thread.thread_id))).scalars().all()
+        fork = await session.get(ThreadFork, thread.thread_id)
+        return {
+            "thread": {
+                "thread_id": thread.thread_id,
+                "messages": await resolve_messages(session, thread),
+                "creation_date": thread.creation_date,
+                "last_updated_date": thread.last_updated_date
+            },
+            "parent_thread_id": fork.parent_thread_id if fork is not None else None,
+            "memory": await self.working_memory.effective_modules(session, thread.thread_id),
+            "runs": [{column.key: getattr(run, column.key) for column in ThreadRun.__table__.columns} for run in runs],
+            "llm_calls": [{column.key: getattr(call, column.key) for column in LLMCall.__table__.columns} for call in calls],
+            "summaries": [{column.key: getattr(summary, column.key) for column in ThreadSummary.__table__.columns} for summary in summaries]
+        }
+
+    async def remove_from_hot(self, session: AsyncSession, thread_id: int):
+        await self.search_index.remove_documents(session, SearchDocument.thread_id == thread_id)
+        for model in (ThreadRun, LLMCall, ThreadSummary, MemoryModule, ThreadMetadata, ThreadFork):
+            await session.execute(delete(model).where(model.thread_id == thread_id))
+        await session.execute(delete(Thread).where(Thread.thread_id == thread_id))
+
+    async def read(self, session: AsyncSession, thread_id: int) -> Optional[Dict[str, Any]]:
+        entry = await session.get(ArchivedThread, thread_id)
+        if entry is None:
+            return None
+        return await asyncio.to_thread(self.read_bundle, self.resolve_path(entry.archive_path), thread_id)
+
+    async def read_thread(self, session: AsyncSession, thread_id: int) -> Optional[Thread]:
+        """Returns a detached Thread built from the archive, for read-only access."""
+        bundle = await self.read(session, thread_id)
+        if bundle is None:
+            return None
+        return Thread(**{**bundle["thread"], "messages": serialization.dumps(bundle["thread"]["messages"])})
+
+    async def restore(self, session: AsyncSession, thread_id: int) -> Optional[Thread]:
+        """Moves an archived thread back into the hot database (in the caller's transaction)."""
+        entry = await session.get(ArchivedThread, thread_id)
+        if entry is None:
+            return None
+        bundle = await asyncio.to_thread(self.read_bundle, self.resolve_path(entry.archive_path), thread_id)
+        if bundle is None:
+            logging.error(f"Archive entry for thread {thread_id} points to a missing bundle in {entry.archive_path}")
+            return None
+
+        messages = bundle["thread"]["messages"]
+        thread = Thread(**{**bundle["thread"], "messages": serialization.dumps(messages)})
+        session.add(thread)
+        state = ThreadState.from_messages(messages)
+        session.add(ThreadMetadata(
+            thread_id=thread_id,
+            message_count=state.message_count,
+            last_tool_call_index=state.last_tool_call_index,
+            pending_tool_call_ids=serialization.dumps(state.pending_tool_call_ids)
+        ))
+        if bundle["parent_thread_id"] is not None:
+            session.add(ThreadFork(thread_id=thread_id, parent_thread_id=bundle["parent_thread_id"], fork_index=0, inherits_memory=0, creation_date=bundle["thread"]["creation_date"]))
+        for module_name, data in bundle["memory"].items():
+            session.add(MemoryModule(thread_id=thread_id, module_name=module_name, data=serialization.dumps(data)))
+            await self.search_index.index_module(session, thread_id, module_name, data)
+        # Rows get fresh ids; ids freed by archiving may have been handed out again since
+        run_ids = {}
+        for run in bundle["runs"]:
+            restored_run = ThreadRun(**{key: value for key, value in run.items() if key != "run_id"})
+            session.add(restored_run)
+            await session.flush()
+            run_ids[run["run_id"]] = restored_run.run_id
+        session.add_all(LLMCall(**{**{key: value for key, value in call.items() if key != "call_id"}, "run_id": run_ids.get(call["run_id"])}) for call in bundle["llm_calls"])
+        session.add_all(ThreadSummary(**{key: value for key, value in summary.items() if key != "summary_id"}) for summary in bundle["summaries"])
+        await session.delete(entry)
+        await session.flush()
+        await self.search_index.reindex_thread(session, thread_id, messages)
+        logging.info(f"Restored thread {thread_id} from {entry.archive_path}")
+        return thread
+
+
+class RetentionManager:
+    def __init__(self, db: Database, policy: RetentionPolicy = RetentionPolicy(), archive: Optional[ThreadArchive] = None, batch_size: int = 50):
+        self.db = db
+        self.policy = policy
+        self.archive = archive
+        self.batch_size = batch_size
+
+    async def thread_id_batches(self):
+        last_thread_id = 0
+        while True:
+            async with self.db.get_async_session() as session:
+                stmt = select(Thread.thread_id).where(Thread.thread_id > last_thread_id).order_by(Thread.thread_id).limit(self.batch_size)
+                thread_ids = (await session.execute(stmt)).scalars().all()
+            if not thread_ids:
+                return
+            yield thread_ids
+            last_thread_id = thread_ids[-1]
+
+    async def prune_runs(self, dry_run: bool = False) -> Dict[str, int]:
+        now = datetime.now()
+        totals = {"threads": 0, "runs_deleted": 0}
+        async for thread_ids in self.thread_id_batches():
+            async with self.db.get_async_session() as session:
+                threads = {thread.thread_id: thread for thread in (await session.execute(select(Thread).where(Thread.thread_id.in_(thread_ids)))).scalars().all()}
+                runs = (await session.execute(select(ThreadRun).where(ThreadRun.thread_id.in_(thread_ids)).order_by(ThreadRun.run_id))).scalars().all()
+                runs_by_thread: Dict[int, List[ThreadRun]] = {}
+                for run in runs:
+                    runs_by_thread.setdefault(run.thread_id, []).append(run)
+
+                doomed = []
+                for thread_id, thread_runs in runs_by_thread.items():
+                    thread = threads.get(thread_id)
+                    doomed.extend(self.policy.runs_to_delete(thread_runs, (thread.last_updated_date if thread else "") or "", now))
+                totals["threads"] += len(thread_ids)
+                totals["runs_deleted"] += len(doomed)
+                if doomed and not dry_run:
+                    # Usage rows stay; they still count towards the thread's totals
+                    await session.execute(delete(ThreadRun).where(ThreadRun.run_id.in_(doomed)))
+                    await session.commit()
+            await asyncio.sleep(0)
+        logging.info(f"Pruned {totals['runs_deleted']} runs across {totals['threads']} threads")
+        return totals
+
+    async def archive_candidates(self, session: AsyncSession, cutoff: str, limit: Optional[int]) -> List[Thread]:
+        # Parents still referenced by live forks stay hot, the forks read through them
+        referenced = select(ThreadFork.parent_thread_id).where(or_(ThreadFork.fork_index > 0, ThreadFork.inherits_memory == 1))
+        # SQLite hands out max(rowid) + 1, so archiving the newest thread would let its id be reused
+        newest = select(func.max(Thread.thread_id)).scalar_subquery()
+        stmt = (
+            select(Thread)
+            .where(Thread.last_updated_date < cutoff, Thread.thread_id.not_in(referenced), Thread.thread_id < newest)
+            .order_by(Thread.thread_id)
+            .limit(limit)
+        )
+        return (await session.execute(stmt)).scalars().all()
+
+    async def archive_threads(self, dry_run: bool = False) -> Dict[str, int]:
+        if self.archive is None or self.policy.archive_after is None:
+            return {"threads_archived": 0}
+        cutoff = (datetime.now() - self.policy.archive_after).isoformat()
+        totals = {"threads_archived": 0}
+        while True:
+            async with self.db.get_async_session() as session:
+                if dry_run:
+                    totals["threads_archived"] = len(await self.archive_candidates(session, cutoff, None))
+                    break
+                threads = await self.archive_candidates(session, cutoff, self.batch_size)
+                if not threads:
+                    break
+
+                bundles_by_month: Dict[str, Dict[int, Dict[str, Any]]] = {}
+                for thread in threads:
+                    month = (thread.last_updated_date or thread.creation_date or "unknown")[:7]
+                    bundles_by_month.setdefault(month, {})[thread.thread_id] = await self.archive.build_bundle(session, thread)
+
+                # Write the archive files before touching the hot database; a failure in between
+                # only leaves an unreferenced bundle that the next run overwrites
+                for month, bundles in bundles_by_month.items():
+                    await asyncio.to_thread(self.archive.write_bundles, self.archive.path_for(month), bundles)
+
+                archived_date = datetime.now().isoformat()
+                for month, bundles in bundles_by_month.items():
+                    for thread_id, bundle in bundles.items():
+                        await self.archive.remove_from_hot(session, thread_id)
+                        session.add(ArchivedThread(
+                            thread_id=thread_id,
+                            archive_path=self.archive.path_for(month),
+                            month=month,
+                            message_count=len(bundle["thread"]["messages"]),
+                            run_count=len(bundle["runs"]),
+                            archived_date=archived_date
+                        ))
+                await session.commit()
+                totals["threads_archived"] += len(threads)
+            await asyncio.sleep(0)
+        logging.info(f"Archived {totals['threads_archived']} threads")
+        return totals
+
+    async def run(self, dry_run: bool = False) -> Dict[str, int]:
+        return {**await self.prune_runs(dry_run), **await self.archive_threads(dry_run)}
+
+    async def archive_stats(self) -> List[Dict[str, Any]]:
+        async with self.db.get_async_session() as session:
+            stmt = select(ArchivedThread.month, func.count(ArchivedThread.thread_id).label("threads"), func.sum(ArchivedThread.run_count).label("runs")).group_by(ArchivedThread.month).order_by(ArchivedThread.month)
+            return [dict(row._mapping) for row in await session.execute(stmt)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keep-last-runs", type=int, default=20)
+    parser.add_argument("--keep-runs-days", type=float, default=7)
+    parser.add_argument("--final-run-only-days", type=float, default=1)
+    parser.add_argument("--archive-days", type=float, default=30)
+    parser.add_argument("--archive-dir", help="Directory for archive files (default: archive/ next to the database)")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--dry-run", action="store_true", help="Only count what would be pruned or archived")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    policy = RetentionPolicy(
+        keep_last_runs=args.keep_last_runs,
+        keep_runs_newer_than=timedelta(days=args.keep_runs_days),
+        final_run_only_after=timedelta(days=args.final_run_only_days),
+        archive_after=timedelta(days=args.archive_days)
+    )
+
+    async def run():
+        db = Database()
+        await db.create_tables()
+        manager = RetentionManager(db, policy, ThreadArchive(db, args.archive_dir), args.batch_size)
+        totals = await manager.run(args.dry_run)
+        await db.close()
+        return totals
+
+    print(serialization.dumps(asyncio.run(run()), pretty=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+import hashlib
+import heapq
+import logging
+import math
+import os
+import re
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import serialization
+from config import get_settings
+from db import Database
+from working_memory_manager import WorkingMemory
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EmbeddingFunction = Callable[[List[str]], List[List[float]]]
+
+class HashingEmbedder:
+    """Deterministic, offline embedding via signed feature hashing of word unigrams and bigrams."""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        tokens = re.findall(r"\w+", text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector))
+        return [value / norm for value in vector] if norm else vector
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed(text) for text in texts]
+
+
+class VectorIndex:
+    """Cosine-similarity index over normalized vectors, NumPy-backed when available."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.keys: List[str] = []
+        self.payloads: List[Any] = []
+        self.positions: Dict[str, int] = {}
+        # Digest of each indexed message, so edits re-embed from the first changed message
+        self.message_digests: List[str] = []
+        # Digest of each indexed module's data, to re-embed only modules that changed
+        self.module_digests: Dict[str, str] = {}
+        if np is not None:
+            self.vectors = np.zeros((16, dim), dtype=np.float32)
+        else:
+            self.vectors = []
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def normalize(self, vector: List[float]) -> List[float]:
+        norm = math.sqrt(sum(value * value for value in vector))
+        return [value / norm for value in vector] if norm else list(vector)
+
+    def add(self, key: str, vector: List[float], payload: Any):
+        vector = self.normalize(vector)
+        if key in self.positions:
+            position = self.positions[key]
+            self.payloads[position] = payload
+        else:
+            position = len(self.keys)
+            self.positions[key] = position
+            self.keys.append(key)
+            self.payloads.append(payload)
+            if np is None:
+                self.vectors.append(array("f", vector))
+                return
+            if position >= len(self.vectors):
+                self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+        if np is not None:
+            self.vectors[position] = vector
+        else:
+            self.vectors[position] = array("f", vector)
+
+    def remove(self, key: str):
+        position = self.positions.pop(key, None)
+        if position is None:
+            return
+        last = len(self.keys) - 1
+        if position != last:
+            # Move the last row into the hole so rows stay contiguous
+            self.keys[position] = self.keys[last]
+            self.payloads[position] = self.payloads[last]
+            self.vectors[position] = self.vectors[last]
+            self.positions[self.keys[position]] = position
+        self.keys.pop()
+        self.payloads.pop()
+        if np is None:
+            self.vectors.pop()
+
+    def remove_prefix(self, prefix: str):
+        for key in [key for key in self.keys if key.startswith(prefix)]:
+            self.remove(key)
+
+    def search(self, vector: List[float], k: int) -> List[Tuple[float, str, Any]]:
+        if not self.keys or k <= 0:
+            return []
+        query = self.normalize(vector)
+        if np is not None:
+            scores = self.vectors[:len(self.keys)] @ np.asarray(query, dtype=np.float32)
+            k = min(k, len(self.keys))
+            top = np.argpartition(-scores, k - 1)[:k]
+            ranked = sorted(top, key=lambda i: -scores[i])
+            return [(float(scores[i]), self.keys[i], self.payloads[i]) for i in ranked]
+        scored = ((sum(a * b for a, b in zip(row, query)), i) for i, row in enumerate(self.vectors))
+        return [(score, self.keys[i], self.payloads[i]) for score, i in heapq.nlargest(k, scored)]
+
+    def save(self, path: str):
+        header = serialization.dumps({
+            "dim": self.dim,
+            "keys": self.keys,
+            "payloads": self.payloads,
+            "message_digests": self.message_digests,
+            "module_digests": self.module_digests
+        })
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header.encode("utf-8") + b"\n")
+            if np is not None:
+                f.write(self.vectors[:len(self.keys)].tobytes())
+            else:
+                for row in self.vectors:
+                    f.write(row.tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "VectorIndex":
+        with open(path, "rb") as f:
+            header = serialization.loads(f.readline())
+            data = f.read()
+        index = cls(header["dim"])
+        index.keys = header["keys"]
+        index.payloads = header["payloads"]
+        index.positions = {key: position for position, key in enumerate(index.keys)}
+        # Files without digests get their messages re-embedded once
+        index.message_digests = header.get("message_digests", [])
+        index.module_digests = header.get("module_digests", {})
+        if np is not None:
+            vectors = np.frombuffer(data, dtype=np.float32).reshape(-1, index.dim)
+            index.vectors = np.zeros((max(16, len(vectors) * 2), index.dim), dtype=np.float32)
+            index.vectors[:len(vectors)] = vectors
+        else:
+            flat = array("f")
+            flat.frombytes(data)
+            index.vectors = [flat[i:i + index.dim] for i in range(0, len(flat), index.dim)]
+        return index
+
+
+def default_index_dir() -> str:
+    # Keep the vector files next to the SQLite database file (e.g. main.db -> vector_index/)
+    database_url = get_settings().database_url
+    database_path = database_url.split(":///", 1)[-1] if ":///" in database_url else ""
+    return os.path.join(os.path.dirname(os.path.abspath(database_path)) if database_path else os.getcwd(), "vector_index")
+
+
+class RetrievalMemory:
+    """Working memory that injects only the top-k entries relevant to the current turn.
+
+    Module entries and thread messages are embedded incrementally; indexes are kept per
+    thread in memory and persisted under `index_dir`.
+    """
+
+    def __init__(self, db: Database, embedder: Optional[EmbeddingFunction] = None, dim: int = 256, top_k: int = 5, index_dir: Optional[str] = None):
+        self.working_memory = WorkingMemory(db)
+        self.embedder = embedder or HashingEmbedder(dim)
+        self.dim = dim
+        self.top_k = top_k
+        self.index_dir = index_dir or default_index_dir()
+        self.indexes: Dict[int, VectorIndex] = {}
+        os.makedirs(self.index_dir, exist_ok=True)
+
+    def index_path(self, thread_id: int) -> str:
+        return os.path.join(self.index_dir, f"thread_{thread_id}.vec")
+
+    def get_index(self, thread_id: int) -> VectorIndex:
+        if thread_id not in self.indexes:
+            path = self.index_path(thread_id)
+            if os.path.exists(path):
+                try:
+                    self.indexes[thread_id] = VectorIndex.load(path)
+                except Exception as e:
+                    logging.error(f"Failed to load vector index for thread {thread_id}, rebuilding: {e}")
+            if thread_id not in self.indexes:
+                self.indexes[thread_id] = VectorIndex(self.dim)
+        return self.indexes[thread_id]
+
+    def save_index(self, thread_id: int):
+        self.get_index(thread_id).save(self.index_path(thread_id))
+
+    def module_entries(self, module_name: str, data: Any) -> List[Tuple[str, str, Any]]:
+        if isinstance(data, dict):
+            items = data.items()
+        elif isinstance(data, list):
+            items = enumerate(data)
+        else:
+            items = [("value", data)]
+        return [
+            (f"module:{module_name}:{key}", f"{module_name} {key}: {value if isinstance(value, str) else serialization.dumps(value)}", {"module": module_name, "key": key, "value": value})
+            for key, value in items
+        ]
+
+    def module_digest(self, data: Any) -> str:
+        return hashlib.blake2b(serialization.dumps(data).encode("utf-8"), digest_size=8).hexdigest()
+
+    def index_module(self, index: VectorIndex, module_name: str, data: Any):
+        index.remove_prefix(f"module:{module_name}:")
+        entries = self.module_entries(module_name, data)
+        if entries:
+            vectors = self.embedder([text for _, text, _ in entries])
+            for (key, _, payload), vector in zip(entries, vectors):
+                index.add(key, vector, payload)
+        index.module_digests[module_name] = self.module_digest(data)
+
+    def unindex_module(self, index: VectorIndex, module_name: str):
+        index.remove_prefix(f"module:{module_name}:")
+        index.module_digests.pop(module_name, None)
+
+    async def sync_modules(self, thread_id: int) -> bool:
+        """Brings the index in line with the thread's modules in the database.
+
+        Modules are also written through plain `WorkingMemory` (sessions, tools, the UI),
+        inherited from a fork's parent or already present from earlier runs.
+        """
+        modules = await self.working_memory.export_memory(thread_id)
+        index = self.get_index(thread_id)
+        changed = False
+        for module_name in set(index.module_digests) - set(modules):
+            self.unindex_module(index, module_name)
+            changed = True
+        for module_name, data in modules.items():
+            if index.module_digests.get(module_name) != self.module_digest(data):
+                self.index_module(index, module_name, data)
+                changed = True
+        return changed
+
+    async def add_or_update_module(self, thread_id: int, module_name: str, data: Any):
+        await self.working_memory.add_or_update_module(thread_id, module_name, data)
+        self.index_module(self.get_index(thread_id), module_name, data)
+        self.save_index(thread_id)
+
+    async def delete_module(self, thread_id: int, module_name: str):
+        await self.working_memory.delete_module(thread_id, module_name)
+        self.unindex_module(self.get_index(thread_id), module_name)
+        self.save_index(thread_id)
+
+    async def clear_memory(self, thread_id: int):
+        await self.working_memory.clear_memory(thread_id)
+        index = self.get_index(thread_id)
+        index.remove_prefix("module:")
+        index.module_digests.clear()
+        self.save_index(thread_id)
+
+    def message_digest(self, message: Dict[str, Any]) -> str:
+        content = message.get("content")
+        text = f"{message.get('role')}\x00{content if isinstance(content, str) else ''}"
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+    def index_messages(self, thread_id: int, messages: List[Dict[str, Any]]):
+        index = self.get_index(thread_id)
+        digests = [self.message_digest(message) for message in messages]
+        if digests == index.message_digests:
+            return
+        # Appends, edits, removals and compaction: re-embed from the first message that differs
+        start = next(
+            (position for position, (old, new) in enumerate(zip(index.message_digests, digests)) if old != new),
+            min(len(index.message_digests), len(digests))
+        )
+        for key in [key for key in index.keys if key.startswith("message:") and int(key.split(":", 1)[1]) >= start]:
+            index.remove(key)
+        new_messages = [
+            (position, message) for position, message in enumerate(messages[start:], start=start)
+            if isinstance(message.get("content"), str) and message.get("content")
+        ]
+        if new_messages:
+            vectors = self.embedder([message["content"] for _, message in new_messages])
+            for (position, message), vector in zip(new_messages, vectors):
+                index.add(f"message:{position}", vector, {"message_index": position, "role": message["role"], "content": message["content"]})
+        index.message_digests = digests
+        self.save_index(thread_id)
+
+    def retrieve(self, thread_id: int, query: str, k: Optional[int] = None, exclude_message_indexes: Optional[set] = None) -> List[Dict[str, Any]]:
+        index = self.get_index(thread_id)
+        k = k or self.top_k
+        exclude_message_indexes = exclude_message_indexes or set()
+        hits = index.search(self.embedder([query])[0], k + len(exclude_message_indexes))
+        results = [
+            {"score": score, **payload} for score, key, payload in hits
+            if not (key.startswith("message:") and payload["message_index"] in exclude_message_indexes)
+        ]
+        return results[:k]
+
+    async def build_instructions(self, thread_id: int, messages: List[Dict[str, Any]], recent: int = 3) -> str:
+        if await self.sync_modules(thread_id):
+            self.save_index(thread_id)
+        self.index_messages(thread_id, messages)
+        recent_messages = messages[-recent:]
+        query = " ".join(message["content"] for message in recent_messages if isinstance(message.get("content"), str))
+        # The most recent messages are already in the prompt, don't inject them twice
+        exclude = set(range(max(0, len(messages) - recent), len(messages)))
+        items = self.retrieve(thread_id, query, exclude_message_indexes=exclude) if query else []
+        return f"Relevant Memory <relevant_memory> {serialization.dumps(items)} </relevant_memory>"
@@ -0,0 +1,82 @@
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select, delete, text
+from sqlalchemy.ext.asyncio import AsyncSession
+import serialization
+from db import SearchDocument
+
+class SearchIndex:
+    """Incrementally maintained SQLite FTS5 index over message content and memory modules.
+
+    Document metadata lives in `search_documents` (indexed by thread_id) and the text in the
+    `search_index` FTS5 table under the same rowid, so per-thread deletes never scan the FTS table.
+    On non-SQLite databases every method is a no-op.
+    """
+
+    def enabled(self, session: AsyncSession) -> bool:
+        return session.bind is not None and session.bind.dialect.name == "sqlite"
+
+    def message_text(self, message: Dict[str, Any]) -> str:
+        content = message.get("content")
+        if isinstance(content, list):
+            content = " ".join(block.get("text", "") for block in content if isinstance(block, dict))
+        return content or ""
+
+    async def add_document(self, session: AsyncSession, thread_id: int, kind: str, content: str, message_index: Optional[int] = None, module_name: Optional[str] = None):
+        if not content or not self.enabled(session):
+            return
+        document = SearchDocument(thread_id=thread_id, kind=kind, message_index=message_index, module_name=module_name)
+        session.add(document)
+        await session.flush()
+        await session.execute(
+            text("INSERT INTO search_index(rowid, content) VALUES (:rowid, :content)"),
+            {"rowid": document.id, "content": content}
+        )
+
+    async def remove_documents(self, session: AsyncSession, *conditions):
+        if not self.enabled(session):
+            return
+        result = await session.execute(select(SearchDocument.id).where(*conditions))
+        document_ids = result.scalars().all()
+        if not document_ids:
+            return
+        await session.execute(
+            text(f"DELETE FROM search_index WHERE rowid IN ({','.join(str(document_id) for document_id in document_ids)})")
+        )
+        await session.execute(delete(SearchDocument).where(SearchDocument.id.in_(document_ids)))
+
+    async def index_message(self, session: AsyncSession, thread_id: int, message_index: int, message: Dict[str, Any]):
+        await self.add_document(session, thread_id, "message", self.message_text(message), message_index=message_index)
+
+    async def reindex_thread(self, session: AsyncSession, thread_id: int, messages: List[Dict[str, Any]]):
+        await self.remove_documents(session, SearchDocument.thread_id == thread_id, SearchDocument.kind == "message")
+        for message_index, message in enumerate(messages):
+            await self.index_message(session, thread_id, message_index, message)
+
+    async def index_module(self, session: AsyncSession, thread_id: int, module_name: str, data: Any):
+        await self.remove_module(session, thread_id, module_name)
+        await self.add_document(session, thread_id, "memory_module", f"{module_name} {serialization.dumps(data)}", module_name=module_name)
+
+    async def remove_module(self, session: AsyncSession, thread_id: int, module_name: Optional[str] = None):
+        conditions = [SearchDocument.thread_id == thread_id, SearchDocument.kind == "memory_module"]
+        if module_name is not None:
+            conditions.append(SearchDocument.module_name == module_name)
+        await self.remove_documents(session, *conditions)
+
+    def match_expression(self, query: str) -> str:
+        # Quote every term so user input can't be parsed as FTS5 query syntax
+        return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+    async def search(self, session: AsyncSession, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        expression = self.match_expression(query)
+        if not expression or not self.enabled(session):
+            return []
+        result = await session.execute(
+            text(
+                "SELECT d.thread_id, d.kind, d.message_index, d.module_name, "
+                "snippet(search_index, 0, '[', ']', '...', 12) AS snippet, bm25(search_index) AS rank "
+                "FROM search_index JOIN search_documents d ON d.id = search_index.rowid "
+                "WHERE search_index MATCH :expression ORDER BY rank LIMIT :limit"
+            ),
+            {"expression": expression, "limit": limit}
+        )
+        return [dict(row._mapping) for row in result]
@@ -0,0 +1,49 @@
+import json
+from typing import Any
+
+# Pick the fastest JSON backend available, falling back to the stdlib.
+# All backends produce compact output (no whitespace) unless pretty=True.
+try:
+    import orjson
+
+    BACKEND = "orjson"
+    DecodeError = orjson.JSONDecodeError
+
+    def dumps(obj: Any, pretty: bool = False) -> str:
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option).decode("utf-8")
+
+    def loads(data: str | bytes) -> Any:
+        return orjson.loads(data)
+
+except ImportError:
+    try:
+        import msgspec
+
+        BACKEND = "msgspec"
+        DecodeError = msgspec.DecodeError
+        _encoder = msgspec.json.Encoder()
+        _decoder = msgspec.json.Decoder()
+
+        def dumps(obj: Any, pretty: bool = False) -> str:
+            data = _encoder.encode(obj)
+            if pretty:
+                data = msgspec.json.format(data, indent=2)
+            return data.decode("utf-8")
+
+        def loads(data: str | bytes) -> Any:
+            return _decoder.decode(data)
+
+    except ImportError:
+        BACKEND = "json"
+        DecodeError = json.JSONDecodeError
+
+        def dumps(obj: Any, pretty: bool = False) -> str:
+            if pretty:
+                return json.dumps(obj, indent=2, ensure_ascii=False)
+            return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+        def loads(data: str | bytes) -> Any:
+            return json.loads(data)
@@ -1,5 +1,6 @@
 import os
-import json
+import serialization
+import tracing
 import asyncio
 from typing import Any, Dict, List
 from dotenv import load_dotenv
@@ -9,24 +10,52 @@ from db import Database, Thread, ThreadRun
 
 from message_thread_manager import MessageThreadManager
 from working_memory_manager import WorkingMemory
+from retrieval_memory import RetrievalMemory
+from compaction import HistoryCompactor
+from memory_storage import InMemoryStore, InMemoryThreadManager
+from loop_detector import LoopDetector
+from retention import ThreadArchive
 from tools.tool_registry import ToolRegistry  
+from message_model import SystemMessage, UserMessage
 
 import logging
 
-logging.basicConfig(level=logging.INFO)
-
 class Session:
-    def __init__(self):
+    def __init__(self, use_retrieval_memory: bool = False, compaction_model: str | None = None, storage: str = "sqlite", loop_detector: LoopDetector | None = None):
         load_dotenv()
-        self.db = Database()
-        self.working_memory = WorkingMemory(self.db)
-        self.thread_manager = MessageThreadManager(self.db)
+        if storage == "memory":
+            # Ephemeral sessions (evals, sub-agents): nothing is written to disk unless
+            # `self.store.snapshot_to_sqlite` is called
+            if use_retrieval_memory or compaction_model:
+                raise ValueError("Retrieval memory and compaction need the sqlite storage backend")
+            self.db = None
+            self.store = InMemoryStore()
+            self.thread_manager = InMemoryThreadManager(self.store)
+            self.working_memory = self.thread_manager.working_memory
+            self.retrieval_memory = None
+            self.compactor = None
+        elif storage == "sqlite":
+            self.db = Database()
+            self.store = None
+            self.working_memory = WorkingMemory(self.db)
+            # With retrieval memory only the top-k relevant entries are injected instead of the full dump
+            self.retrieval_memory = RetrievalMemory(self.db) if use_retrieval_memory else None
+            self.compactor = HistoryCompactor(self.db, model_name=compaction_model) if compaction_model else None
+            # Archived threads are read through and restored on their first write
+            self.thread_manager = MessageThreadManager(self.db, compactor=self.compactor, archive=ThreadArchive(self.db))
+        else:
+            raise ValueError(f"Unknown storage backend: {storage}")
         self.thread_id = None
         self.running = False
         self.stop_event = asyncio.Event()
         self.tool_registry = ToolRegistry()
         self.example_tool = self.tool_registry.get_tool("example_function")
+        # The registry maps every function name to its tool; pass each tool once
+        self.tools = list({id(tool): tool for tool in self.tool_registry.get_all_tools().values()}.values())
         self.iteration_count = 0
+        # Stops runaway loops (same tool calls, near-identical turns, no progress)
+        self.loop_detector = loop_detector or LoopDetector()
+        self.status: Dict[str, Any] = {"status": "idle", "iterations": 0, "loop_detection": self.loop_detector.counts, "last_detection": None}
 
     async def init_session(self, thread_id: int | None, objective: str, objective_images: List[Dict[str, Any]]):
         if thread_id is None:
@@ -34,9 +63,9 @@ class Session:
         else:
             self.thread_id = thread_id
 
-        await self.thread_manager.cleanup_incomplete_tool_calls(self.thread_id)
+        await self.thread_manager.clean_up_thread(self.thread_id)
 
-        await self.thread_manager.add_message(self.thread_id, {"role": "user", "content": objective})
+        await self.thread_manager.add_message(self.thread_id, UserMessage(objective).to_dict())
         
         await self.working_memory.clear_memory(self.thread_id)
         
@@ -44,56 +73,102 @@ class Session:
 
         logging.info(f"Agent session initialization complete for thread_id: {self.thread_id}")
 
-    async def run_session(self, max_iterations: int | None = None):
+    async def run_session(self, max_iterations: int | None = None) -> Dict[str, Any]:
+        self.status["status"] = "running"
         try:
-            await self.thread_manager.cleanup_incomplete_tool_calls(self.thread_id)
-            
+            await self.thread_manager.clean_up_thread(self.thread_id)
+            message_count = len(await self.thread_manager.list_messages(self.thread_id))
+
             while not self.stop_event.is_set():
-                logging.info(f"Starting iteration {self.iteration_count + 1} in run_session")
+                with tracing.span("session.iteration", {"thread_id": self.thread_id, "iteration": self.iteration_count + 1}) as iteration_span:
+                    logging.info(f"Starting iteration {self.iteration_count + 1} in run_session")
                 
-                # Check if the session should stop
-                if await self.thread_manager.should_stop(self.thread_id):
-                    logging.info("Session stop requested, breaking the loop")
-                    break
-
-                additional_instructions = f"Working Memory <working_memory> {json.dumps(await self.working_memory.export_memory(), indent=3)} </working_memory>"
-                agent_instructions = "" 
-                agent_continue_instructions = ""
-
-                await self.thread_manager.run_thread(
-                    self.thread_id, 
-                    {"role": "system", "content": agent_instructions}, 
-                    model_name="anthropic/claude-3-5-sonnet-20240620",
-                    temperature=0.1,
-                    tools=self.tools,
-                    additional_instructions=additional_instructions,
-                    tool_choice="auto",
-                    max_tokens=8192
-                )
-
-                logging.info("Thread run completed") 
-
-                self.iteration_count += 1
-
-                if max_iterations and self.iteration_count >= max_iterations:
-                    logging.info(f"Reached maximum iterations ({max_iterations}), ending session")
-                    break
-
-                # Add agent_continue_instructions if there are more iterations
-                if self.iteration_count > 0 and (max_iterations is None or self.iteration_count < max_iterations):
-                    await self.thread_manager.add_message(self.thread_id, {"role": "user", "content": agent_continue_instructions})
-
-                await asyncio.sleep(0.1)
+                    # Check if the session should stop
+                    if await self.thread_manager.should_stop(self.thread_id):
+                        logging.info("Session stop requested, breaking the loop")
+                        self.status["status"] = "stopped"
+                        break
+
+                    if self.retrieval_memory:
+                        messages = await self.thread_manager.list_messages(self.thread_id)
+                        additional_instructions = await self.retrieval_memory.build_instructions(self.thread_id, messages)
+                    else:
+                        additional_instructions = f"Working Memory <working_memory> {serialization.dumps(await self.working_memory.export_memory(self.thread_id))} </working_memory>"
+                    agent_instructions = "" 
+                    agent_continue_instructions = ""
+
+                    await self.thread_manager.run_thread(
+                        self.thread_id, 
+                        SystemMessage(agent_instructions).to_dict(), 
+                        model_name="anthropic/claude-3-5-sonnet-20240620",
+                        temperature=0.1,
+                        tools=self.tools,
+                        additional_instructions=additional_instructions,
+                        tool_choice="auto",
+                        max_tokens=8192
+                    )
+
+                    logging.info("Thread run completed") 
+
+                    self.iteration_count += 1
+                    self.status["iterations"] = self.iteration_count
+
+                    messages = await self.thread_manager.list_messages(self.thread_id)
+                    action = self.loop_detector.observe(messages[message_count:], await self.working_memory.export_memory(self.thread_id))
+                    message_count = len(messages)
+                    if action is not None:
+                        self.status["last_detection"] = {**action, "iteration": self.iteration_count}
+                        iteration_span.set_attribute("loop_detection", action["reason"])
+                        if action["policy"] == "halt":
+                            logging.warning(f"Halting session for thread {self.thread_id}: {action['reason']}")
+                            self.status["status"] = "stalled"
+                            break
+
+                    if max_iterations and self.iteration_count >= max_iterations:
+                        logging.info(f"Reached maximum iterations ({max_iterations}), ending session")
+                        break
+
+                    if action is not None and action["policy"] == "backoff":
+                        # Ends early if the session is stopped meanwhile
+                        try:
+                            await asyncio.wait_for(self.stop_event.wait(), action["delay"])
+                        except asyncio.TimeoutError:
+                            pass
+
+                    # Add agent_continue_instructions if there are more iterations
+                    if self.iteration_count > 0 and (max_iterations is None or self.iteration_count < max_iterations):
+                        continue_instructions = action["instruction"] if action is not None and action["policy"] == "inject" else agent_continue_instructions
+                        await self.thread_manager.add_message(self.thread_id, UserMessage(continue_instructions).to_dict())
+                        message_count += 1
+
+                    await asyncio.sleep(0.1)
                 
-                if self.stop_event.is_set():
-                    logging.info("Stop event detected, ending session")
-                    break
+                    if self.stop_event.is_set():
+                        logging.info("Stop event detected, ending session")
+                        self.status["status"] = "stopped"
+                        break
 
         except Exception as e:
             logging.exception(f"Error in session: {str(e)}")
+            self.status["status"] = "error"
         finally:
             self.running = False
-            self.thread_manager.save_thread_run(self.thread_id)
+            if self.status["status"] == "running":
+                self.status["status"] = "completed"
+            if self.thread_id is not None:
+                await self.thread_manager.save_thread_run(self.thread_id, status=self.status["status"])
+        return self.status
+
+    async def close(self):
+        await self.thread_manager.close()
+        if self.db is not None:
+            await self.db.close()
+
+    def trace_stats(self) -> Dict[str, Any]:
+        tracer = tracing.get_tracer()
+        if isinstance(tracer, tracing.RecordingTracer):
+            return tracer.thread_stats(self.thread_id)
+        return {}
 
 if __name__ == "__main__":
-    pass
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO)
\ No newline at end of file
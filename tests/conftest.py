@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# Tests never touch the real database or workspace
+_scratch_dir = tempfile.mkdtemp(prefix="automata-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_scratch_dir}/test.db"
+os.environ["WORKSPACE_DIR"] = os.path.join(_scratch_dir, "workspace")
+# Use litellm's bundled cost map; its background fetch needs network and races the import
+os.environ["LITELLM_LOCAL_MODEL_COST_MAP"] = "True"
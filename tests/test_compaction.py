@@ -0,0 +1,40 @@
+import asyncio
+from types import SimpleNamespace
+import compaction
+from compaction import HistoryCompactor
+from db import Database
+from message_thread_manager import MessageThreadManager
+
+
+def test_split_index_keeps_tool_results_with_their_turn():
+    compactor = HistoryCompactor(None, keep_recent=2)
+    messages = [{"role": "user"}, {"role": "assistant"}, {"role": "tool"}, {"role": "tool"}, {"role": "user"}]
+    assert compactor.split_index(messages, 0) == 1
+    compactor.keep_recent = 0
+    assert compactor.split_index(messages, 0) == len(messages)
+
+
+def test_compaction_and_invalidation_on_edit(tmp_path, monkeypatch):
+    async def summarize(prompt, model_name, temperature=0):
+        return SimpleNamespace(choices=[SimpleNamespace(message={"content": "SUMMARY"})])
+
+    monkeypatch.setattr(compaction, "make_llm_api_call", summarize)
+
+    async def scenario():
+        db = Database(f"sqlite+aiosqlite:///{tmp_path}/compaction.db")
+        compactor = HistoryCompactor(db, max_messages=4, keep_recent=0)
+        manager = MessageThreadManager(db, compactor=compactor)
+        thread_id = await manager.create_thread()
+        for i in range(6):
+            await manager.add_message(thread_id, {"role": "user", "content": f"m{i}"})
+        summary = await compactor.compact(thread_id)
+        view = await compactor.compacted_view(thread_id, await manager.list_messages(thread_id))
+        await manager.modify_message(thread_id, 2, {"role": "user", "content": "edited"})
+        edited_view = await compactor.compacted_view(thread_id, await manager.list_messages(thread_id))
+        await db.close()
+        return summary, view, edited_view
+
+    summary, view, edited_view = asyncio.run(scenario())
+    assert summary is not None and summary.end_index == 6
+    assert "SUMMARY" in view[0]["content"] and len(view) == 1
+    assert [message["content"] for message in edited_view] == ["m0", "m1", "edited", "m3", "m4", "m5"]
@@ -0,0 +1,9 @@
+import os
+import import_budget
+
+
+def test_core_modules_import_within_budget():
+    # Slow CI machines can raise the budget with IMPORT_BUDGET_MS
+    budget_ms = float(os.environ.get("IMPORT_BUDGET_MS", 800))
+    failures = import_budget.check(import_budget.DEFAULT_MODULES, budget_ms)
+    assert not failures, "\n".join(failures)
@@ -0,0 +1,86 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+import llm
+from llm import LLMRouter
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def response(content: str):
+    return SimpleNamespace(choices=[SimpleNamespace(message={"role": "assistant", "content": content})])
+
+
+def fake_completion(monkeypatch, behaviours):
+    """Replaces completion_once; behaviours maps a model name to a coroutine function."""
+    calls = []
+
+    async def completion_once(messages, model_name, *args, **kwargs):
+        calls.append(model_name)
+        return await behaviours[model_name]()
+
+    monkeypatch.setattr(llm, "completion_once", completion_once)
+    return calls
+
+
+def ok(content: str = '{"answer": 1}', delay: float = 0.0):
+    async def behaviour():
+        if delay:
+            await asyncio.sleep(delay)
+        return response(content)
+    return behaviour
+
+
+def fail(status_code: int):
+    async def behaviour():
+        raise StatusError(status_code)
+    return behaviour
+
+
+def test_empty_json_fails_over_to_next_route(monkeypatch):
+    calls = fake_completion(monkeypatch, {"a": ok("{}"), "b": ok()})
+    router = LLMRouter(["a", "b"])
+    result = asyncio.run(router.call([{"role": "user", "content": "hi"}], json_mode=True))
+    assert result.choices[0].message["content"] == '{"answer": 1}'
+    assert calls == ["a", "b"]
+    assert router.routes[0].error_rate() > 0
+
+
+@pytest.mark.parametrize("status_code", [429, 500, 503])
+def test_retryable_status_fails_over(monkeypatch, status_code):
+    calls = fake_completion(monkeypatch, {"a": fail(status_code), "b": ok("hello")})
+    router = LLMRouter(["a", "b"])
+    result = asyncio.run(router.call([{"role": "user", "content": "hi"}]))
+    assert result.choices[0].message["content"] == "hello"
+    assert calls == ["a", "b"]
+    # Only rate limits put the route into cooldown
+    assert router.routes[0].healthy == (status_code != 429)
+
+
+def test_client_error_is_not_failed_over(monkeypatch):
+    calls = fake_completion(monkeypatch, {"a": fail(400), "b": ok("hello")})
+    router = LLMRouter(["a", "b"])
+    with pytest.raises(StatusError):
+        asyncio.run(router.call([{"role": "user", "content": "hi"}]))
+    assert calls == ["a"]
+
+
+def test_slow_primary_is_hedged(monkeypatch):
+    calls = fake_completion(monkeypatch, {"a": ok("slow", delay=1.0), "b": ok("fast")})
+    router = LLMRouter(["a", "b"], hedge_after=0.05)
+    result = asyncio.run(router.call([{"role": "user", "content": "hi"}]))
+    assert result.choices[0].message["content"] == "fast"
+    assert calls == ["a", "b"]
+
+
+def test_demoted_route_recovers_as_errors_decay(monkeypatch):
+    route = llm.Route("a", error_half_life=0.05)
+    for _ in range(4):
+        route.record_failure(0.2)
+    assert not route.healthy
+    monkeypatch.setattr(llm.time, "monotonic", lambda: route.error_updated + 0.1)
+    assert route.healthy
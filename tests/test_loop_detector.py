@@ -0,0 +1,73 @@
+import pytest
+import serialization
+from loop_detector import LoopDetector
+
+
+def tool_turn(call_id: str, name: str, arguments: dict, output: str, content=None):
+    return [
+        {"role": "assistant", "content": content, "tool_calls": [{"id": call_id, "type": "function", "function": {"name": name, "arguments": serialization.dumps(arguments)}}]},
+        {"role": "tool", "tool_call_id": call_id, "name": name, "content": output}
+    ]
+
+
+def text_turn(text: str):
+    return [{"role": "assistant", "content": text}]
+
+
+def test_tool_call_only_turns_doing_different_work_are_not_flagged():
+    detector = LoopDetector()
+    for i, path in enumerate(["a.py", "b.py", "c.py", "d.py"]):
+        action = detector.observe(tool_turn(f"call_{i}", "read_file", {"file_path": path}, f"contents of {path}"), {"files_read": i})
+        assert action is None
+    assert detector.counts["iterations"] == 4
+    assert detector.fingerprint(tool_turn("x", "read_file", {}, "")).text_simhash is None
+
+
+def test_repeated_tool_call_is_detected_regardless_of_argument_order():
+    detector = LoopDetector()
+    actions = [
+        detector.observe(tool_turn(f"call_{i}", "grep_files", {"pattern": "TODO", "path": "."} if i % 2 else {"path": ".", "pattern": "TODO"}, f"match {i}"), {"step": i})
+        for i in range(3)
+    ]
+    assert actions[:2] == [None, None]
+    assert actions[2]["reason"] == "repeated_tool_call"
+    assert actions[2]["policy"] == "inject"
+    assert "repeated tool call" in actions[2]["instruction"]
+
+
+def test_near_identical_assistant_text_is_detected():
+    detector = LoopDetector()
+    base = "I checked the configuration and the deployment settings look correct so the next step is to rerun the failing integration tests on the staging cluster"
+    texts = [base, base + " now", base + " again"]
+    actions = [detector.observe(text_turn(text), {"attempt": i}) for i, text in enumerate(texts)]
+    assert actions[:2] == [None, None]
+    assert actions[2]["reason"] == "repeated_output"
+
+
+def test_cycle_without_progress_is_detected():
+    detector = LoopDetector()
+    turns = [
+        text_turn("Let me open the settings page and look for the export option in the menu"),
+        text_turn("The database schema has a users table with an email column that is unique"),
+    ]
+    actions = [detector.observe(turns[i % 2], {"notes": "same"}) for i in range(4)]
+    assert actions[:3] == [None, None, None]
+    assert actions[3]["reason"] == "no_progress"
+
+
+def test_policies_escalate_and_then_repeat_the_last():
+    detector = LoopDetector(policies=("inject", "backoff", "halt"), backoff_base=1.0)
+    policies = []
+    for i in range(12):
+        action = detector.observe(tool_turn(f"call_{i}", "read_file", {"file_path": "same.py"}, "same"), {"step": i})
+        if action is not None:
+            policies.append(action["policy"])
+            if action["policy"] == "backoff":
+                assert action["delay"] == 1.0
+    assert policies == ["inject", "backoff", "halt", "halt"]
+    assert detector.counts["halt"] == 2
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        LoopDetector(policies=("inject", "retry"))
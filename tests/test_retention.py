@@ -0,0 +1,126 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from sqlalchemy import select, update
+from db import Database, ThreadRun, ArchivedThread
+from message_thread_manager import MessageThreadManager
+from retention import RetentionManager, RetentionPolicy, ThreadArchive
+
+ARCHIVE_NOW = RetentionPolicy(keep_last_runs=None, keep_runs_newer_than=None, final_run_only_after=None, archive_after=timedelta(0))
+
+
+def run(run_id, status="completed", days_old=0):
+    return SimpleNamespace(run_id=run_id, status=status, creation_date=(datetime.now() - timedelta(days=days_old)).isoformat())
+
+
+def test_policy_keeps_latest_and_control_runs():
+    policy = RetentionPolicy(keep_last_runs=2, keep_runs_newer_than=timedelta(days=7), final_run_only_after=timedelta(days=1))
+    now = datetime.now()
+    runs = [run(1, days_old=30), run(2, "paused", days_old=30), run(3, days_old=30), run(4, days_old=1), run(5)]
+    # Recently active thread: the last two and the recent ones are kept, paused runs always are
+    assert policy.runs_to_delete(runs, now.isoformat(), now) == [3, 1]
+    # Idle thread whose latest run completed keeps only that run (and control runs)
+    idle_since = (now - timedelta(days=2)).isoformat()
+    assert sorted(policy.runs_to_delete(runs, idle_since, now)) == [1, 3, 4]
+
+
+async def add_thread(manager: MessageThreadManager, contents, runs: int = 0) -> int:
+    thread_id = await manager.create_thread()
+    for content in contents:
+        await manager.add_message(thread_id, {"role": "user", "content": content})
+    for _ in range(runs):
+        await manager.save_thread_run(thread_id)
+    return thread_id
+
+
+async def run_ids(db: Database, thread_id: int):
+    async with db.get_async_session() as session:
+        return (await session.execute(select(ThreadRun.run_id).where(ThreadRun.thread_id == thread_id))).scalars().all()
+
+
+def test_archive_read_through_and_restore(tmp_path):
+    async def scenario():
+        db = Database(f"sqlite+aiosqlite:///{tmp_path}/hot.db")
+        archive = ThreadArchive(db, str(tmp_path / "archive"))
+        manager = MessageThreadManager(db, archive=archive)
+        newest_placeholder = await add_thread(manager, [])
+        await manager.save_thread_run(newest_placeholder)
+        archived = await add_thread(manager, ["a0", "a1"], runs=3)
+        await add_thread(manager, ["newest"])
+
+        totals = await RetentionManager(db, ARCHIVE_NOW, archive).archive_threads()
+        archived_run_ids = await run_ids(db, archived)
+        read_through = await manager.list_messages(archived), len(await manager.list_runs(archived))
+
+        # Ids freed by archiving are handed out again before the thread comes back
+        await manager.save_thread_run(newest_placeholder)
+        reused = set(await run_ids(db, newest_placeholder))
+        await manager.add_message(archived, {"role": "user", "content": "a2"})
+        restored_run_ids = set(await run_ids(db, archived))
+        async with db.get_async_session() as session:
+            entry = await session.get(ArchivedThread, archived)
+        messages = await manager.list_messages(archived)
+        await db.close()
+        return totals, archived_run_ids, read_through, reused, restored_run_ids, entry, messages
+
+    totals, archived_run_ids, read_through, reused, restored_run_ids, entry, messages = asyncio.run(scenario())
+    # The newest thread is never archived, so its id can't be reused
+    assert totals["threads_archived"] == 2
+    assert archived_run_ids == []
+    assert [message["content"] for message in read_through[0]] == ["a0", "a1"]
+    assert read_through[1] == 3
+    assert len(restored_run_ids) == 3 and not restored_run_ids & reused
+    assert entry is None
+    assert [message["content"] for message in messages] == ["a0", "a1", "a2"]
+
+
+def test_parents_of_live_forks_stay_hot(tmp_path):
+    async def scenario():
+        db = Database(f"sqlite+aiosqlite:///{tmp_path}/hot.db")
+        archive = ThreadArchive(db, str(tmp_path / "archive"))
+        manager = MessageThreadManager(db, archive=archive)
+        parent = await add_thread(manager, ["p0", "p1", "p2"])
+        idle = await add_thread(manager, ["idle"])
+        # The fork is the newest thread, so it stays hot
+        fork = await manager.fork_thread(parent, 2)
+        await manager.add_message(fork, {"role": "user", "content": "f2"})
+
+        await RetentionManager(db, ARCHIVE_NOW, archive).archive_threads()
+        async with db.get_async_session() as session:
+            archived = set((await session.execute(select(ArchivedThread.thread_id))).scalars().all())
+        fork_messages = await manager.list_messages(fork)
+        await db.close()
+        return parent, idle, archived, fork_messages
+
+    parent, idle, archived, fork_messages = asyncio.run(scenario())
+    assert archived == {idle}
+    assert [message["content"] for message in fork_messages] == ["p0", "p1", "f2"]
+
+
+def test_relative_archive_paths_resolve_from_any_directory(tmp_path, monkeypatch):
+    archive_dir = tmp_path / "archive"
+
+    async def scenario():
+        db = Database(f"sqlite+aiosqlite:///{tmp_path}/hot.db")
+        manager = MessageThreadManager(db, archive=ThreadArchive(db, str(archive_dir)))
+        archived = await add_thread(manager, ["old"])
+        await add_thread(manager, ["newest"])
+        await RetentionManager(db, ARCHIVE_NOW, manager.archive).archive_threads()
+        async with db.get_async_session() as session:
+            entry = await session.get(ArchivedThread, archived)
+            stored_path = entry.archive_path
+            # Entries written before paths were made absolute
+            await session.execute(update(ArchivedThread).values(archive_path=os.path.join("archive", os.path.basename(stored_path))))
+            await session.commit()
+
+        monkeypatch.chdir(tmp_path / "elsewhere")
+        reader = MessageThreadManager(db, archive=ThreadArchive(db, str(archive_dir)))
+        messages = await reader.list_messages(archived)
+        await db.close()
+        return stored_path, messages
+
+    (tmp_path / "elsewhere").mkdir()
+    stored_path, messages = asyncio.run(scenario())
+    assert os.path.isabs(stored_path)
+    assert [message["content"] for message in messages] == ["old"]
@@ -0,0 +1,48 @@
+import asyncio
+from db import Database
+from message_thread_manager import MessageThreadManager
+from retrieval_memory import RetrievalMemory
+
+
+def message_contents(memory: RetrievalMemory, thread_id: int):
+    index = memory.get_index(thread_id)
+    return sorted(payload["content"] for key, payload in zip(index.keys, index.payloads) if key.startswith("message:"))
+
+
+def test_edited_message_is_reembedded(tmp_path):
+    memory = RetrievalMemory(Database(f"sqlite+aiosqlite:///{tmp_path}/memory.db"), index_dir=str(tmp_path / "index"))
+    messages = [
+        {"role": "user", "content": "the secret color is blue"},
+        {"role": "assistant", "content": "noted"}
+    ]
+    memory.index_messages(1, messages)
+    messages[0] = {"role": "user", "content": "the secret color is green"}
+    memory.index_messages(1, messages)
+    assert message_contents(memory, 1) == ["noted", "the secret color is green"]
+
+    del messages[0]
+    memory.index_messages(1, messages)
+    assert message_contents(memory, 1) == ["noted"]
+
+    # The digests survive a reload, so nothing is re-embedded
+    memory.indexes.clear()
+    assert memory.get_index(1).message_digests == [memory.message_digest(messages[0])]
+
+
+def test_modules_written_through_working_memory_are_retrieved(tmp_path):
+    async def scenario():
+        db = Database(f"sqlite+aiosqlite:///{tmp_path}/memory.db")
+        manager = MessageThreadManager(db)
+        memory = RetrievalMemory(db, index_dir=str(tmp_path / "index"))
+        thread_id = await manager.create_thread()
+        await manager.working_memory.add_or_update_module(thread_id, "project", {"goal": "ship the landing page"})
+        messages = [{"role": "user", "content": "what is the goal of the landing page project"}]
+        first = await memory.build_instructions(thread_id, messages)
+        await manager.working_memory.delete_module(thread_id, "project")
+        second = await memory.build_instructions(thread_id, messages)
+        await db.close()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert "ship the landing page" in first
+    assert "ship the landing page" not in second
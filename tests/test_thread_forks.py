@@ -0,0 +1,71 @@
+import asyncio
+import pytest
+from db import Database
+from message_thread_manager import MessageThreadManager
+
+PENDING_CALL = {
+    "role": "assistant",
+    "content": "",
+    "tool_calls": [{"id": "call_1", "type": "function", "function": {"name": "read_file", "arguments": "{}"}}]
+}
+
+
+def contents(messages):
+    return [message["content"] for message in messages]
+
+
+async def parent_with_fork(db: Database, fork_index: int):
+    manager = MessageThreadManager(db)
+    parent = await manager.create_thread()
+    for content in ("u0", None, "u2", "u3"):
+        await manager.add_message(parent, {"role": "user", "content": content})
+    fork = await manager.fork_thread(parent, fork_index)
+    return manager, parent, fork
+
+
+@pytest.mark.parametrize("operation, expected_parent", [
+    ("modify", ["u0", None, "edited", "u3"]),
+    ("remove", ["u0", None, "u3"]),
+    ("clean_up", ["u0", "u2", "u3"]),
+])
+def test_rewriting_parent_keeps_fork_history(tmp_path, operation, expected_parent):
+    async def scenario():
+        db = Database(f"sqlite+aiosqlite:///{tmp_path}/forks.db")
+        manager, parent, fork = await parent_with_fork(db, 3)
+        before = await manager.list_messages(fork)
+        if operation == "modify":
+            await manager.modify_message(parent, 2, {"role": "user", "content": "edited"})
+        elif operation == "remove":
+            await manager.remove_message(parent, 2)
+        else:
+            await manager.add_message(parent, PENDING_CALL)
+            assert await manager.clean_up_thread(parent)
+        result = await manager.list_messages(parent), before, await manager.list_messages(fork)
+        await db.close()
+        return result
+
+    parent_messages, fork_before, fork_after = asyncio.run(scenario())
+    assert contents(parent_messages) == expected_parent
+    assert contents(fork_before) == ["u0", None, "u2"]
+    assert fork_after == fork_before
+
+
+def test_fork_memory_is_copied_on_parent_write(tmp_path):
+    async def scenario():
+        db = Database(f"sqlite+aiosqlite:///{tmp_path}/forks.db")
+        manager = MessageThreadManager(db)
+        memory = manager.working_memory
+        parent = await manager.create_thread()
+        await memory.add_or_update_module(parent, "notes", {"v": 1})
+        fork = await manager.fork_thread(parent)
+        inherited = await memory.export_memory(fork)
+        await memory.add_or_update_module(parent, "notes", {"v": 2})
+        await memory.delete_module(fork, "notes")
+        result = inherited, await memory.export_memory(fork), await memory.export_memory(parent)
+        await db.close()
+        return result
+
+    inherited, fork_memory, parent_memory = asyncio.run(scenario())
+    assert inherited == {"notes": {"v": 1}}
+    assert fork_memory == {}
+    assert parent_memory == {"notes": {"v": 2}}
@@ -0,0 +1,106 @@
+import asyncio
+import pytest
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
+from db import Database, Thread
+
+
+def insert_thread(thread_id=None, label="t"):
+    async def write(session):
+        session.add(Thread(thread_id=thread_id, messages="[]", creation_date=label, last_updated_date=label))
+        await session.flush()
+    return write
+
+
+async def count_threads(db: Database) -> int:
+    async with db.get_async_session() as session:
+        return (await session.execute(select(func.count(Thread.thread_id)))).scalar_one()
+
+
+def test_concurrent_writes_share_transactions(tmp_path):
+    async def scenario():
+        db = Database(f"sqlite+aiosqlite:///{tmp_path}/buffer.db", group_commit=True, commit_interval=0.05)
+        await db.create_tables()
+        await asyncio.gather(*(db.write(insert_thread()) for _ in range(50)))
+        stats = dict(db.write_buffer.stats)
+        total = await count_threads(db)
+        await db.close()
+        return stats, total
+
+    stats, total = asyncio.run(scenario())
+    assert total == 50
+    assert stats["operations"] == 50
+    assert stats["transactions"] < 10
+
+
+def test_failing_write_is_retried_alone(tmp_path):
+    async def scenario():
+        db = Database(f"sqlite+aiosqlite:///{tmp_path}/buffer.db", group_commit=True, commit_interval=0.05)
+        await db.create_tables()
+        await db.write(insert_thread(thread_id=1))
+        # The duplicate key fails the shared transaction; the other writes must still land
+        results = await asyncio.gather(
+            db.write(insert_thread()), db.write(insert_thread(thread_id=1)), db.write(insert_thread()),
+            return_exceptions=True
+        )
+        failed = db.write_buffer.stats["failed"]
+        total = await count_threads(db)
+        await db.close()
+        return results, failed, total
+
+    results, failed, total = asyncio.run(scenario())
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], IntegrityError)
+    assert failed == 1
+    assert total == 3
+
+
+def test_fire_and_forget_writes_are_visible_to_reads(tmp_path):
+    async def scenario():
+        db = Database(f"sqlite+aiosqlite:///{tmp_path}/buffer.db", group_commit=True, durable=False, commit_interval=1.0)
+        await db.create_tables()
+        for _ in range(5):
+            assert await db.write(insert_thread()) is None
+        # Reads flush unacknowledged writes first instead of waiting out the commit interval
+        total = await asyncio.wait_for(count_threads(db), timeout=0.5)
+        await db.close()
+        return total
+
+    assert asyncio.run(scenario()) == 5
+
+
+def test_close_flushes_pending_writes(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path}/buffer.db"
+
+    async def write_and_close():
+        db = Database(url, group_commit=True, durable=False, commit_interval=1.0)
+        await db.create_tables()
+        for _ in range(3):
+            await db.write(insert_thread())
+        await db.close()
+
+    async def reopen():
+        db = Database(url)
+        total = await count_threads(db)
+        await db.close()
+        return total
+
+    asyncio.run(write_and_close())
+    assert asyncio.run(reopen()) == 3
+
+
+def test_writes_from_inside_a_buffered_write_are_rejected(tmp_path):
+    async def scenario():
+        db = Database(f"sqlite+aiosqlite:///{tmp_path}/buffer.db", group_commit=True)
+        await db.create_tables()
+
+        async def nested(session):
+            await db.write(insert_thread())
+
+        try:
+            await db.write(nested)
+        finally:
+            await db.close()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scenario())
@@ -0,0 +1,51 @@
+from typing import Any, Dict, List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import serialization
+from db import Thread, ThreadFork
+
+# Copy-on-write helpers for forked threads. A fork shares its parent's first `fork_index`
+# messages by reference; the prefix is only copied when either side rewrites it.
+
+async def resolve_messages(session: AsyncSession, thread: Thread) -> List[Dict[str, Any]]:
+    messages = serialization.loads(thread.messages)
+    fork = await session.get(ThreadFork, thread.thread_id)
+    if fork is None or not fork.fork_index:
+        return messages
+    parent = await session.get(Thread, fork.parent_thread_id)
+    return (await resolve_messages(session, parent))[:fork.fork_index] + messages
+
+
+async def resolve_messages_blob(session: AsyncSession, thread: Thread) -> str:
+    fork = await session.get(ThreadFork, thread.thread_id)
+    if fork is None or not fork.fork_index:
+        return thread.messages
+    return serialization.dumps(await resolve_messages(session, thread))
+
+
+async def materialize_children(session: AsyncSession, thread: Thread, from_index: int):
+    """Copies the shared prefix into forks that would see a rewrite at or after `from_index`."""
+    stmt = select(ThreadFork).where(ThreadFork.parent_thread_id == thread.thread_id, ThreadFork.fork_index > from_index)
+    forks = (await session.execute(stmt)).scalars().all()
+    if not forks:
+        return
+    parent_messages = await resolve_messages(session, thread)
+    for fork in forks:
+        child = await session.get(Thread, fork.thread_id)
+        child.messages = serialization.dumps(parent_messages[:fork.fork_index] + serialization.loads(child.messages))
+        fork.fork_index = 0
+
+
+async def detach_for_rewrite(session: AsyncSession, thread: Thread, from_index: int) -> List[Dict[str, Any]]:
+    """Prepares a thread for a non-append write and returns its full message list.
+
+    Forks sharing the affected range get their own copy, and the thread itself stops
+    reading its prefix from its parent, since the caller is about to store the full list.
+    """
+    await materialize_children(session, thread, from_index)
+    messages = await resolve_messages(session, thread)
+    fork = await session.get(ThreadFork, thread.thread_id)
+    if fork is not None and fork.fork_index:
+        fork.fork_index = 0
+        thread.messages = serialization.dumps(messages)
+    return messages
@@ -1,14 +1,23 @@
 import os
 import asyncio
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from .tool import Tool, ToolResult
-from config import settings
+from .workspace_index import WorkspaceIndex
+from config import get_settings
 
 class FilesTool(Tool):
+    read_only_functions = {"read_file", "list_files", "grep_files", "stat_file"}
+
     def __init__(self):
         super().__init__()
-        self.workspace = settings.workspace_dir
-        os.makedirs(self.workspace, exist_ok=True)
+        self.workspace = get_settings().ensure_workspace_dir()
+        self.index = WorkspaceIndex(self.workspace)
+
+    def resource_key(self, function_name: str, arguments: Dict[str, Any]) -> Optional[str]:
+        # Listings and searches depend on every file
+        if function_name in ("list_files", "grep_files"):
+            return None
+        return super().resource_key(function_name, arguments)
 
     async def create_file(self, file_path: str, content: str) -> ToolResult:
         try:
@@ -18,15 +27,18 @@ class FilesTool(Tool):
             os.makedirs(os.path.dirname(full_path), exist_ok=True)
             with open(full_path, 'w') as f:
                 f.write(content)
+            self.index.invalidate(file_path)
             return self.success_response(f"File '{file_path}' created successfully.")
         except Exception as e:
             return self.fail_response(f"Error creating file: {str(e)}")
 
-    async def read_file(self, file_path: str) -> ToolResult:
+    async def read_file(self, file_path: str, start_line: Optional[int] = None, end_line: Optional[int] = None) -> ToolResult:
         try:
-            full_path = os.path.join(self.workspace, file_path)
-            with open(full_path, 'r') as f:
-                content = f.read()
+            # Served from the index cache while the file's size and mtime are unchanged
+            if start_line is not None or end_line is not None:
+                content = self.index.read_lines(file_path, start_line or 1, end_line)
+            else:
+                content = self.index.read(file_path)
             return self.success_response({"file_path": file_path, "content": content})
         except Exception as e:
             return self.fail_response(f"Error reading file: {str(e)}")
@@ -36,6 +48,7 @@ class FilesTool(Tool):
             full_path = os.path.join(self.workspace, file_path)
             with open(full_path, 'w') as f:
                 f.write(content)
+            self.index.invalidate(file_path)
             return self.success_response(f"File '{file_path}' updated successfully.")
         except Exception as e:
             return self.fail_response(f"Error updating file: {str(e)}")
@@ -44,10 +57,36 @@ class FilesTool(Tool):
         try:
             full_path = os.path.join(self.workspace, file_path)
             os.remove(full_path)
+            self.index.forget(file_path)
             return self.success_response(f"File '{file_path}' deleted successfully.")
         except Exception as e:
             return self.fail_response(f"Error deleting file: {str(e)}")
 
+    async def list_files(self, directory: str = ".", pattern: str = "*") -> ToolResult:
+        try:
+            entries = self.index.list(directory, pattern)
+            return self.success_response({"files": [{"path": entry.path, "size": entry.size} for entry in entries]})
+        except Exception as e:
+            return self.fail_response(f"Error listing files: {str(e)}")
+
+    async def grep_files(self, pattern: str, path_pattern: str = "*", max_results: int = 100) -> ToolResult:
+        try:
+            matches = self.index.grep(pattern, path_pattern, max_results)
+            return self.success_response({"matches": [{"path": path, "line": line, "text": text} for path, line, text in matches]})
+        except Exception as e:
+            return self.fail_response(f"Error searching files: {str(e)}")
+
+    async def stat_file(self, file_path: str) -> ToolResult:
+        try:
+            entry = self.index.stat(file_path)
+            if entry is None:
+                return self.fail_response(f"File '{file_path}' does not exist.")
+            if entry.content_hash is None:
+                self.index.read(file_path)
+            return self.success_response(entry.to_dict())
+        except Exception as e:
+            return self.fail_response(f"Error getting file info: {str(e)}")
+
     def schema(self) -> List[Dict[str, Any]]:
         return [
             {
@@ -82,6 +121,14 @@ class FilesTool(Tool):
                             "file_path": {
                                 "type": "string",
                                 "description": "The relative path of the file to read"
+                            },
+                            "start_line": {
+                                "type": "integer",
+                                "description": "Optional first line to read (1-based)"
+                            },
+                            "end_line": {
+                                "type": "integer",
+                                "description": "Optional last line to read (inclusive)"
                             }
                         },
                         "required": ["file_path"]
@@ -125,6 +172,69 @@ class FilesTool(Tool):
                         "required": ["file_path"]
                     }
                 }
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "list_files",
+                    "description": "List files in the workspace",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "directory": {
+                                "type": "string",
+                                "description": "The relative directory to list, defaults to the workspace root"
+                            },
+                            "pattern": {
+                                "type": "string",
+                                "description": "Optional glob pattern the relative paths must match, e.g. '*.py'"
+                            }
+                        },
+                        "required": []
+                    }
+                }
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "grep_files",
+                    "description": "Search file contents in the workspace with a regular expression",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "pattern": {
+                                "type": "string",
+                                "description": "The regular expression to search for"
+                            },
+                            "path_pattern": {
+                                "type": "string",
+                                "description": "Optional glob pattern to restrict the searched files"
+                            },
+                            "max_results": {
+                                "type": "integer",
+                                "description": "Maximum number of matching lines to return"
+                            }
+                        },
+                        "required": ["pattern"]
+                    }
+                }
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "stat_file",
+                    "description": "Get the size, modification time, content hash and line count of a file in the workspace",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "file_path": {
+                                "type": "string",
+                                "description": "The relative path of the file"
+                            }
+                        },
+                        "required": ["file_path"]
+                    }
+                }
             }
         ]
 
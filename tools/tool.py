@@ -1,18 +1,35 @@
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
-import json
+import serialization
 
 @dataclass
 class ToolResult:
     success: bool
     output: str
 
+@dataclass(frozen=True)
+class ExecutionPolicy:
+    backend: str = "inline"  # inline (event loop), thread or process
+    timeout: Optional[float] = None  # Seconds of wall time before the call fails
+    memory_limit: Optional[int] = None  # Address space limit in bytes, process backend only
+    max_output_bytes: Optional[int] = None  # Longer outputs are truncated
+
 class Tool(ABC):
+    # Functions without side effects; they may run speculatively and their results are memoized
+    read_only_functions: Set[str] = set()
+    # How each function is executed; functions not listed run inline on the event loop
+    execution_policies: Dict[str, ExecutionPolicy] = {}
+
     def __init__(self):
         pass
 
+    def resource_key(self, function_name: str, arguments: Dict[str, Any]) -> Optional[str]:
+        # The resource a call reads or writes; writes invalidate memoized reads of the same resource.
+        # None means unknown, so a write with no key invalidates every memoized read.
+        return arguments.get("file_path")
+
     @abstractmethod
     def schema(self) -> List[Dict[str, Any]]:
         pass
@@ -21,7 +38,7 @@ class Tool(ABC):
         if isinstance(data, str):
             text = data
         else:
-            text = json.dumps(data, indent=2)
+            text = serialization.dumps(data)
         return ToolResult(success=True, output=text)
 
     def fail_response(self, msg: str) -> ToolResult:
@@ -2,6 +2,8 @@ from typing import List, Dict, Any
 from .tool import Tool, ToolResult
 
 class ExampleTool(Tool):
+    read_only_functions = {"example_function"}
+
     def __init__(self):
         super().__init__()
 
@@ -0,0 +1,128 @@
+import asyncio
+import importlib
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+from .tool import ExecutionPolicy, Tool, ToolResult
+
+try:
+    import resource
+except ImportError:  # Not available on Windows, memory limits are skipped there
+    resource = None
+
+DEFAULT_POLICY = ExecutionPolicy()
+
+# Tool instances are created once per worker process
+_worker_tools: Dict[str, Tool] = {}
+
+
+def run_tool_in_worker(module_name: str, class_name: str, function_name: str, arguments: Dict[str, Any], memory_limit: Optional[int]) -> ToolResult:
+    key = f"{module_name}.{class_name}"
+    if key not in _worker_tools:
+        tool_cls = getattr(importlib.import_module(module_name), class_name)
+        _worker_tools[key] = tool_cls()
+    tool = _worker_tools[key]
+
+    previous_limit = None
+    if memory_limit is not None and resource is not None:
+        previous_limit = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, previous_limit[1]))
+    try:
+        result = asyncio.run(getattr(tool, function_name)(**arguments))
+    except MemoryError:
+        return ToolResult(success=False, output=f"Error in {function_name}: memory limit of {memory_limit} bytes exceeded")
+    finally:
+        if previous_limit is not None:
+            resource.setrlimit(resource.RLIMIT_AS, previous_limit)
+    return result if isinstance(result, ToolResult) else ToolResult(success=True, output=str(result))
+
+
+def run_tool_in_thread(tool: Tool, function_name: str, arguments: Dict[str, Any]) -> Any:
+    return asyncio.run(getattr(tool, function_name)(**arguments))
+
+
+class ToolExecutor:
+    """Runs tool functions according to their `Tool.execution_policies`.
+
+    `thread` and `process` backends keep blocking or CPU-heavy tools off the event loop.
+    Process workers are isolated: a crash, timeout or memory limit turns into
+    `ToolResult(success=False)` and the pool's workers are killed and replaced.
+    Call `shutdown` when done, or leftover workers keep the interpreter from exiting.
+    """
+
+    def __init__(self, max_thread_workers: int = 8, max_process_workers: int = 2):
+        self.max_thread_workers = max_thread_workers
+        self.max_process_workers = max_process_workers
+        self.thread_pool: Optional[ThreadPoolExecutor] = None
+        self.process_pool: Optional[ProcessPoolExecutor] = None
+
+    def policy(self, tool: Tool, function_name: str) -> ExecutionPolicy:
+        return tool.execution_policies.get(function_name, DEFAULT_POLICY)
+
+    def get_thread_pool(self) -> ThreadPoolExecutor:
+        if self.thread_pool is None:
+            self.thread_pool = ThreadPoolExecutor(max_workers=self.max_thread_workers, thread_name_prefix="tool")
+        return self.thread_pool
+
+    def get_process_pool(self) -> ProcessPoolExecutor:
+        if self.process_pool is None:
+            self.process_pool = ProcessPoolExecutor(max_workers=self.max_process_workers)
+        return self.process_pool
+
+    def recycle_process_pool(self):
+        # A timed out worker can't be interrupted, only killed. Calls running on the pool's
+        # other workers fail as crashed; new calls get a fresh pool.
+        if self.process_pool is None:
+            return
+        pool, self.process_pool = self.process_pool, None
+        if hasattr(pool, "kill_workers"):
+            pool.kill_workers()
+        else:
+            for process in list((pool._processes or {}).values()):
+                if process.is_alive():
+                    process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def cap_output(self, result: Any, policy: ExecutionPolicy) -> Any:
+        if policy.max_output_bytes is None or not isinstance(result, ToolResult):
+            return result
+        encoded = result.output.encode("utf-8")
+        if len(encoded) <= policy.max_output_bytes:
+            return result
+        truncated = encoded[:policy.max_output_bytes].decode("utf-8", errors="ignore")
+        return ToolResult(success=result.success, output=f"{truncated}\n[output truncated: {len(encoded)} bytes, limit {policy.max_output_bytes}]")
+
+    async def execute(self, tool: Tool, function_name: str, arguments: Dict[str, Any]) -> Any:
+        policy = self.policy(tool, function_name)
+        loop = asyncio.get_running_loop()
+
+        if policy.backend == "inline":
+            call = getattr(tool, function_name)(**arguments)
+        elif policy.backend == "thread":
+            call = loop.run_in_executor(self.get_thread_pool(), run_tool_in_thread, tool, function_name, arguments)
+        elif policy.backend == "process":
+            call = loop.run_in_executor(
+                self.get_process_pool(), run_tool_in_worker,
+                type(tool).__module__, type(tool).__qualname__, function_name, arguments, policy.memory_limit
+            )
+        else:
+            raise ValueError(f"Unknown execution backend: {policy.backend}")
+
+        try:
+            result = await asyncio.wait_for(call, timeout=policy.timeout)
+        except asyncio.TimeoutError:
+            if policy.backend == "process":
+                self.recycle_process_pool()
+            return ToolResult(success=False, output=f"Error in {function_name}: timed out after {policy.timeout} seconds")
+        except BrokenProcessPool:
+            logging.error(f"Worker process crashed while running {function_name}")
+            self.recycle_process_pool()
+            return ToolResult(success=False, output=f"Error in {function_name}: worker process crashed")
+        return self.cap_output(result, policy)
+
+    def shutdown(self):
+        if self.thread_pool is not None:
+            self.thread_pool.shutdown(wait=False, cancel_futures=True)
+            self.thread_pool = None
+        self.recycle_process_pool()
@@ -0,0 +1,110 @@
+import asyncio
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+import serialization
+from .tool import ToolResult
+from .tool_registry import ToolRegistry
+from .tool_executor import ToolExecutor
+
+MemoKey = Tuple[str, str]
+
+class ToolPrefetcher:
+    """Runs read-only tool calls speculatively and memoizes them for one iteration of a thread.
+
+    A read-only call is started as soon as its name and complete arguments are known
+    (`observe_partial` for streamed calls, `prefetch_calls` for a full response) and
+    later executions of the same call await the same task. Any other call on a tool
+    invalidates memoized reads of the same resource in every thread, since threads share
+    the workspace (see `Tool.resource_key`). `clear` drops a thread's memo at the end of
+    the iteration, so changes made outside the tools are seen by the next one.
+    """
+
+    def __init__(self, tool_registry: ToolRegistry, executor: Optional[ToolExecutor] = None, max_entries: int = 128):
+        self.tool_registry = tool_registry
+        self.executor = executor or ToolExecutor()
+        self.max_entries = max_entries
+        self.memos: Dict[int, Dict[MemoKey, Tuple[Optional[str], asyncio.Task]]] = defaultdict(dict)
+
+    def memo_key(self, function_name: str, arguments: Dict[str, Any]) -> MemoKey:
+        return function_name, serialization.dumps(sorted(arguments.items()))
+
+    def is_read_only(self, function_name: str) -> bool:
+        tool = self.tool_registry.get_tool(function_name)
+        return tool is not None and function_name in tool.read_only_functions
+
+    def resource_key(self, function_name: str, arguments: Dict[str, Any]) -> Optional[str]:
+        tool = self.tool_registry.get_tool(function_name)
+        return tool.resource_key(function_name, arguments) if tool is not None else None
+
+    async def call(self, function_name: str, arguments: Dict[str, Any]) -> Any:
+        tool = self.tool_registry.get_tool(function_name)
+        if tool is None:
+            raise ValueError(f"Unknown tool function: {function_name}")
+        return await self.executor.execute(tool, function_name, arguments)
+
+    def prefetch(self, thread_id: int, function_name: str, arguments: Dict[str, Any]) -> Optional[asyncio.Task]:
+        if not self.is_read_only(function_name):
+            return None
+        key = self.memo_key(function_name, arguments)
+        memo = self.memos[thread_id]
+        if key not in memo:
+            task = asyncio.create_task(self.call(function_name, arguments))
+            # Speculative tasks may be dropped unawaited, so retrieve their errors here
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+            memo[key] = (self.resource_key(function_name, arguments), task)
+            while len(memo) > self.max_entries:
+                # Evict the oldest entry; whoever awaits its task still gets the result
+                memo.pop(next(iter(memo)))
+        return memo[key][1]
+
+    def observe_partial(self, thread_id: int, function_name: str, partial_arguments: str) -> Optional[asyncio.Task]:
+        """Feed streamed tool-call deltas; prefetches once the arguments parse as complete JSON."""
+        if not function_name or not self.is_read_only(function_name):
+            return None
+        try:
+            arguments = serialization.loads(partial_arguments)
+        except serialization.DecodeError:
+            return None
+        return self.prefetch(thread_id, function_name, arguments) if isinstance(arguments, dict) else None
+
+    def prefetch_calls(self, thread_id: int, calls: List[Tuple[str, Dict[str, Any]]]):
+        """Starts every read-only call that doesn't follow a write to the same resource in `calls`."""
+        written = set()
+        for function_name, arguments in calls:
+            resource = self.resource_key(function_name, arguments)
+            if self.is_read_only(function_name):
+                if resource not in written and None not in written:
+                    self.prefetch(thread_id, function_name, arguments)
+            else:
+                written.add(resource)
+
+    def invalidate(self, resource: Optional[str]):
+        for memo in self.memos.values():
+            for key in [key for key, (memo_resource, _) in memo.items() if resource is None or memo_resource is None or memo_resource == resource]:
+                del memo[key]
+
+    async def execute(self, thread_id: int, function_name: str, arguments: Dict[str, Any]) -> Any:
+        if not self.is_read_only(function_name):
+            resource = self.resource_key(function_name, arguments)
+            self.invalidate(resource)
+            try:
+                return await self.call(function_name, arguments)
+            finally:
+                # Reads started while the write was running may have seen the old state
+                self.invalidate(resource)
+
+        key = self.memo_key(function_name, arguments)
+        task = self.prefetch(thread_id, function_name, arguments)
+        try:
+            result = await asyncio.shield(task)
+        except Exception:
+            self.memos[thread_id].pop(key, None)
+            raise
+        if isinstance(result, ToolResult) and not result.success:
+            self.memos[thread_id].pop(key, None)
+        return result
+
+    def clear(self, thread_id: int):
+        for _, task in self.memos.pop(thread_id, {}).values():
+            if not task.done():
+                task.cancel()
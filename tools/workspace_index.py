@@ -0,0 +1,170 @@
+import fnmatch
+import hashlib
+import os
+import re
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+@dataclass(slots=True)
+class FileEntry:
+    path: str
+    size: int
+    mtime_ns: int
+    content_hash: Optional[str] = None
+    line_offsets: Optional[List[int]] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "path": self.path,
+            "size": self.size,
+            "mtime": self.mtime_ns / 1e9,
+            "content_hash": self.content_hash,
+            "lines": len(self.line_offsets) if self.line_offsets is not None else None
+        }
+
+
+class WorkspaceIndex:
+    """Incremental index of the files under a workspace directory.
+
+    The tree is rescanned by mtime at most every `scan_interval` seconds. File contents are
+    kept in an LRU cache bounded by `cache_bytes` and served from memory while a file's
+    size and mtime are unchanged.
+    """
+
+    def __init__(self, root: str, scan_interval: float = 1.0, cache_bytes: int = 32 * 1024 * 1024):
+        self.root = os.path.abspath(root)
+        self.scan_interval = scan_interval
+        self.cache_bytes = cache_bytes
+        self.entries: Dict[str, FileEntry] = {}
+        self.cache: OrderedDict[str, str] = OrderedDict()
+        self.cached_bytes = 0
+        self.last_scan = 0.0
+
+    def relative(self, full_path: str) -> str:
+        return os.path.relpath(full_path, self.root)
+
+    def refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self.last_scan < self.scan_interval:
+            return
+        self.last_scan = now
+        seen = set()
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as iterator:
+                    for item in iterator:
+                        if item.is_dir(follow_symlinks=False):
+                            stack.append(item.path)
+                        elif item.is_file(follow_symlinks=False):
+                            stat = item.stat(follow_symlinks=False)
+                            path = self.relative(item.path)
+                            seen.add(path)
+                            self.update_entry(path, stat.st_size, stat.st_mtime_ns)
+            except FileNotFoundError:
+                continue
+        for path in [path for path in self.entries if path not in seen]:
+            self.forget(path)
+
+    def update_entry(self, path: str, size: int, mtime_ns: int) -> FileEntry:
+        entry = self.entries.get(path)
+        if entry is not None and entry.size == size and entry.mtime_ns == mtime_ns:
+            return entry
+        # Changed or new: drop derived data, it's recomputed on the next read
+        entry = FileEntry(path, size, mtime_ns)
+        self.entries[path] = entry
+        self.evict(path)
+        return entry
+
+    def stat(self, path: str) -> Optional[FileEntry]:
+        path = os.path.normpath(path)
+        try:
+            stat = os.stat(os.path.join(self.root, path))
+        except FileNotFoundError:
+            self.forget(path)
+            return None
+        return self.update_entry(path, stat.st_size, stat.st_mtime_ns)
+
+    def forget(self, path: str):
+        path = os.path.normpath(path)
+        self.entries.pop(path, None)
+        self.evict(path)
+
+    def invalidate(self, path: str) -> Optional[FileEntry]:
+        # Called after our own writes, which may not change size or mtime granularity-wise
+        self.forget(path)
+        return self.stat(path)
+
+    def evict(self, path: str):
+        content = self.cache.pop(path, None)
+        if content is not None:
+            self.cached_bytes -= len(content)
+
+    def read(self, path: str) -> str:
+        path = os.path.normpath(path)
+        entry = self.stat(path)
+        if entry is None:
+            raise FileNotFoundError(f"No such file: '{path}'")
+        content = self.cache.get(path)
+        if content is not None:
+            self.cache.move_to_end(path)
+            return content
+
+        with open(os.path.join(self.root, path), 'r') as f:
+            content = f.read()
+        entry.content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        entry.line_offsets = [0] + [match.end() for match in re.finditer("\n", content)]
+        if len(content) <= self.cache_bytes:
+            self.cache[path] = content
+            self.cached_bytes += len(content)
+            while self.cached_bytes > self.cache_bytes:
+                _, evicted = self.cache.popitem(last=False)
+                self.cached_bytes -= len(evicted)
+        return content
+
+    def read_lines(self, path: str, start_line: int, end_line: Optional[int] = None) -> str:
+        # Lines are 1-based and inclusive
+        content = self.read(path)
+        offsets = self.entries[os.path.normpath(path)].line_offsets
+        start = offsets[min(max(start_line, 1), len(offsets)) - 1]
+        end = offsets[end_line] if end_line is not None and end_line < len(offsets) else len(content)
+        return content[start:end]
+
+    def line_number(self, path: str, offset: int) -> int:
+        return bisect_right(self.entries[os.path.normpath(path)].line_offsets, offset)
+
+    def list(self, directory: str = ".", pattern: str = "*") -> List[FileEntry]:
+        self.refresh()
+        directory = os.path.normpath(directory)
+        prefix = "" if directory == "." else directory + os.sep
+        return sorted(
+            (entry for path, entry in self.entries.items() if path.startswith(prefix) and fnmatch.fnmatch(path, pattern)),
+            key=lambda entry: entry.path
+        )
+
+    def grep(self, pattern: str, path_pattern: str = "*", max_results: int = 100, max_file_size: int = 2 * 1024 * 1024) -> List[Tuple[str, int, str]]:
+        regex = re.compile(pattern)
+        matches = []
+        for entry in self.list(".", path_pattern):
+            if entry.size > max_file_size:
+                continue
+            try:
+                content = self.read(entry.path)
+            except (UnicodeDecodeError, FileNotFoundError):
+                continue
+            last_line = 0
+            for match in regex.finditer(content):
+                line_number = self.line_number(entry.path, match.start())
+                if line_number == last_line:
+                    continue
+                last_line = line_number
+                offsets = self.entries[entry.path].line_offsets
+                line_end = offsets[line_number] if line_number < len(offsets) else len(content)
+                matches.append((entry.path, line_number, content[offsets[line_number - 1]:line_end].rstrip("\n")))
+                if len(matches) >= max_results:
+                    return matches
+        return matches
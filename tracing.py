@@ -0,0 +1,169 @@
+import contextvars
+import cProfile
+import io
+import logging
+import pstats
+import random
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+# The tracer interface mirrors OpenTelemetry's (`start_as_current_span`, `set_attribute`,
+# `record_exception`), so an `opentelemetry.trace.get_tracer(...)` instance can be passed
+# to `set_tracer` directly. The default tracer is a no-op.
+
+class Span:
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def record_exception(self, exception: BaseException):
+        pass
+
+    def is_recording(self) -> bool:
+        return False
+
+
+_NOOP_SPAN = Span()
+
+
+class Tracer:
+    @contextmanager
+    def start_as_current_span(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        yield _NOOP_SPAN
+
+
+class RecordedSpan(Span):
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]], parent: Optional["RecordedSpan"]):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.parent = parent
+        self.error: Optional[str] = None
+        self.duration = 0.0
+
+    @property
+    def thread_id(self) -> Optional[int]:
+        span = self
+        while span is not None:
+            if "thread_id" in span.attributes:
+                return span.attributes["thread_id"]
+            span = span.parent
+        return None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_exception(self, exception: BaseException):
+        self.error = repr(exception)
+
+    def is_recording(self) -> bool:
+        return True
+
+
+_current_span: contextvars.ContextVar[Optional[RecordedSpan]] = contextvars.ContextVar("current_span", default=None)
+_unsampled: contextvars.ContextVar[bool] = contextvars.ContextVar("unsampled", default=False)
+
+
+class RecordingTracer(Tracer):
+    """Keeps per-thread timing aggregates in memory.
+
+    `sample_rate` applies to root spans; children follow their root's decision.
+    With `profile_slow_spans` set, spans named in `profile_span_names` run under cProfile
+    and the profile is kept when the span takes longer than that many seconds.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, max_samples: int = 1000, profile_slow_spans: Optional[float] = None, profile_span_names: tuple = ("run_thread", "session.iteration"), max_profiles: int = 20):
+        self.sample_rate = sample_rate
+        self.profile_slow_spans = profile_slow_spans
+        self.profile_span_names = profile_span_names
+        self.durations: Dict[Any, Dict[str, deque]] = defaultdict(lambda: defaultdict(lambda: deque(maxlen=max_samples)))
+        self.counters: Dict[Any, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self.slow_profiles: deque = deque(maxlen=max_profiles)
+        self.profiling = False
+
+    @contextmanager
+    def start_as_current_span(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        parent = _current_span.get()
+        if _unsampled.get() or (parent is None and random.random() >= self.sample_rate):
+            token = _unsampled.set(True)
+            try:
+                yield _NOOP_SPAN
+            finally:
+                _unsampled.reset(token)
+            return
+
+        span = RecordedSpan(name, attributes, parent)
+        token = _current_span.set(span)
+        profiler = None
+        if self.profile_slow_spans is not None and name in self.profile_span_names and not self.profiling:
+            profiler = cProfile.Profile()
+            self.profiling = True
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                self.profiling = False
+                if span.duration >= self.profile_slow_spans:
+                    self.keep_profile(span, profiler)
+            _current_span.reset(token)
+            self.record(span)
+
+    def record(self, span: RecordedSpan):
+        thread_id = span.thread_id
+        self.durations[thread_id][span.name].append(span.duration)
+        counters = self.counters[thread_id]
+        for key in ("bytes_serialized", "prompt_tokens", "completion_tokens"):
+            if key in span.attributes:
+                counters[key] += span.attributes[key]
+        if span.error:
+            counters["errors"] += 1
+
+    def keep_profile(self, span: RecordedSpan, profiler: cProfile.Profile):
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(30)
+        self.slow_profiles.append({
+            "thread_id": span.thread_id,
+            "span": span.name,
+            "duration": span.duration,
+            "profile": output.getvalue()
+        })
+        logging.info(f"Captured profile for slow span {span.name} ({span.duration:.3f}s)")
+
+    def thread_stats(self, thread_id: Any) -> Dict[str, Any]:
+        spans = {}
+        for name, samples in self.durations.get(thread_id, {}).items():
+            ordered = sorted(samples)
+            spans[name] = {
+                "count": len(ordered),
+                "total": sum(ordered),
+                "p50": ordered[len(ordered) // 2],
+                "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            }
+        return {"spans": spans, **self.counters.get(thread_id, {})}
+
+
+_tracer: Any = Tracer()
+
+
+def get_tracer():
+    return _tracer
+
+
+def set_tracer(tracer):
+    global _tracer
+    _tracer = tracer
+
+
+def span(name: str, attributes: Optional[Dict[str, Any]] = None):
+    return _tracer.start_as_current_span(name, attributes=attributes)
@@ -1,24 +1,24 @@
-import json
+import serialization
 import streamlit as st
 import asyncio
+import logging
 from db import Database
 from message_thread_manager import MessageThreadManager
-from sqlalchemy import text
+from retention import ThreadArchive
 from tools.tool_registry import ToolRegistry
 from working_memory_manager import WorkingMemory
+from message_model import AssistantMessage, SystemMessage, UserMessage
+
+logging.basicConfig(level=logging.INFO)
 
 # Initialize the database, message thread manager, tool registry, and working memory
 db = Database()
-thread_manager = MessageThreadManager(db)
+thread_manager = MessageThreadManager(db, archive=ThreadArchive(db))
 tool_registry = ToolRegistry()
 working_memory = WorkingMemory(db)
 
 async def get_all_threads():
-    async with db.get_async_session() as session:
-        result = await session.execute(
-            text("SELECT thread_id, creation_date FROM threads ORDER BY creation_date DESC")
-        )
-        return result.fetchall()
+    return await thread_manager.list_threads()
 
 async def create_new_thread():
     return await thread_manager.create_thread()
@@ -28,7 +28,8 @@ async def run_thread(thread_id, system_message, model_name, json_mode=False, tem
     return response
 
 async def add_message(thread_id, role, content):
-    await thread_manager.add_message(thread_id, {"role": role, "content": content})
+    message = UserMessage(content) if role == "user" else AssistantMessage(content)
+    await thread_manager.add_message(thread_id, message.to_dict())
 
 async def get_message(thread_id, message_index):
     return await thread_manager.get_message(thread_id, message_index)
@@ -42,6 +43,9 @@ async def modify_message(thread_id, message_index, new_content):
 async def remove_message(thread_id, message_index):
     await thread_manager.remove_message(thread_id, message_index)
 
+async def search_threads(query):
+    return await thread_manager.search(query)
+
 
 def main():
     st.set_page_config(layout="wide")
@@ -54,10 +58,24 @@ def main():
             st.session_state.selected_thread = new_thread_id
             st.rerun()
         
+        search_query = st.text_input("Search:", key="search_query")
+        if search_query:
+            hits = asyncio.run(search_threads(search_query))
+            if not hits:
+                st.info("No matches found.")
+            for hit_index, hit in enumerate(hits):
+                location = f"message {hit['message_index']}" if hit['kind'] == 'message' else f"module {hit['module_name']}"
+                if st.button(f"Thread {hit['thread_id']} ({location})", key=f"search_hit_{hit_index}"):
+                    st.session_state.selected_thread = hit['thread_id']
+                    st.rerun()
+                st.caption(hit['snippet'])
+            st.divider()
+
         threads = asyncio.run(get_all_threads())
         for thread in threads:
-            if st.button(f"Thread {thread.thread_id}", key=f"thread_{thread.thread_id}"):
-                st.session_state.selected_thread = thread.thread_id
+            label = f"Thread {thread['thread_id']}" + (" (archived)" if thread.get("archived") else "")
+            if st.button(label, key=f"thread_{thread['thread_id']}"):
+                st.session_state.selected_thread = thread['thread_id']
                 st.rerun()
 
     # Main chat area
@@ -121,7 +139,7 @@ def main():
                         st.rerun()
             with col4:
                 if st.button("Run", use_container_width=True):
-                    system_message = {"role": "system", "content": system_instructions}
+                    system_message = SystemMessage(system_instructions).to_dict()
                     selected_tools = [tool_registry.get_tool(tool).schema()[0] for tool in tools] if tools else None
                     response = asyncio.run(run_thread(
                         thread_id,
@@ -148,10 +166,10 @@ def main():
                 if st.button("Add/Update Module"):
                     if module_name and module_data:
                         try:
-                            data = json.loads(module_data)
+                            data = serialization.loads(module_data)
                             asyncio.run(working_memory.add_or_update_module(thread_id, module_name, data))
                             st.success(f"Module '{module_name}' added/updated successfully.")
-                        except json.JSONDecodeError:
+                        except serialization.DecodeError:
                             st.error("Invalid JSON data. Please check your input.")
                         except Exception as e:
                             st.error(f"Error: {str(e)}")
@@ -0,0 +1,81 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import Database, LLMCall
+from llm import get_cache_usage, load_litellm
+
+class UsageLedger:
+    def __init__(self, db: Database):
+        self.db = db
+
+    def compute_cost(self, response: Any) -> float:
+        try:
+            return float(load_litellm().completion_cost(completion_response=response) or 0.0)
+        except Exception as e:
+            logging.debug(f"Could not compute cost for response: {e}")
+            return 0.0
+
+    async def record_call(self, thread_id: int, model_name: str, response: Any, latency: float) -> LLMCall:
+        usage = getattr(response, "usage", None)
+        cache_usage = get_cache_usage(response)
+        now = datetime.now()
+        call = LLMCall(
+            thread_id=thread_id,
+            model_name=getattr(response, "model", None) or model_name,
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+            cache_read_tokens=cache_usage["cache_read_tokens"],
+            cache_write_tokens=cache_usage["cache_write_tokens"],
+            latency=latency,
+            cost=self.compute_cost(response),
+            creation_date=now.isoformat(),
+            day=now.date().isoformat()
+        )
+        async with self.db.get_async_session() as session:
+            session.add(call)
+            await session.commit()
+        return call
+
+    async def attach_to_run(self, session: AsyncSession, thread_id: int, run_id: int):
+        stmt = update(LLMCall).where(LLMCall.thread_id == thread_id, LLMCall.run_id.is_(None)).values(run_id=run_id)
+        await session.execute(stmt)
+
+    def totals_columns(self):
+        return (
+            func.count(LLMCall.call_id).label("calls"),
+            func.coalesce(func.sum(LLMCall.prompt_tokens), 0).label("prompt_tokens"),
+            func.coalesce(func.sum(LLMCall.completion_tokens), 0).label("completion_tokens"),
+            func.coalesce(func.sum(LLMCall.cache_read_tokens), 0).label("cache_read_tokens"),
+            func.coalesce(func.sum(LLMCall.cache_write_tokens), 0).label("cache_write_tokens"),
+            func.coalesce(func.sum(LLMCall.cost), 0.0).label("cost"),
+            func.avg(LLMCall.latency).label("avg_latency")
+        )
+
+    async def aggregate(self, group_by, **filters) -> List[Dict[str, Any]]:
+        stmt = select(group_by, *self.totals_columns()).group_by(group_by).order_by(group_by)
+        for column_name, value in filters.items():
+            if value is not None:
+                stmt = stmt.where(getattr(LLMCall, column_name) == value)
+        async with self.db.get_async_session() as session:
+            result = await session.execute(stmt)
+            return [dict(row._mapping) for row in result]
+
+    async def usage_by_thread(self, thread_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        return await self.aggregate(LLMCall.thread_id, thread_id=thread_id)
+
+    async def usage_by_run(self, thread_id: int) -> List[Dict[str, Any]]:
+        return await self.aggregate(LLMCall.run_id, thread_id=thread_id)
+
+    async def usage_by_model(self, day: Optional[str] = None) -> List[Dict[str, Any]]:
+        return await self.aggregate(LLMCall.model_name, day=day)
+
+    async def usage_by_day(self, model_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        return await self.aggregate(LLMCall.day, model_name=model_name)
+
+    async def list_calls(self, thread_id: int) -> List[LLMCall]:
+        async with self.db.get_async_session() as session:
+            stmt = select(LLMCall).where(LLMCall.thread_id == thread_id).order_by(LLMCall.call_id)
+            result = await session.execute(stmt)
+            return result.scalars().all()
@@ -1,16 +1,19 @@
-import json
+import serialization
 import logging
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from db import Database, MemoryModule
+from sqlalchemy import delete
+from db import Database, MemoryModule, ThreadFork
 from sqlalchemy.exc import IntegrityError
 from asyncio import Lock
 from contextlib import asynccontextmanager
+from search_index import SearchIndex
 
 class WorkingMemory:
     def __init__(self, db: Database):
         self.db = db
         self.lock = Lock()
+        self.search_index = SearchIndex()
         # logging.info("WorkingMemory initialized")
 
     @asynccontextmanager
@@ -25,31 +28,75 @@ class WorkingMemory:
                 logging.error("Session rollback due to error", exc_info=True)
                 raise
 
-    async def add_or_update_module(self, thread_id: int, module_name: str, data: dict):
+    async def inheriting_fork(self, session: AsyncSession, thread_id: int):
+        fork = await session.get(ThreadFork, thread_id)
+        return fork if fork is not None and fork.inherits_memory else None
+
+    async def effective_modules(self, session: AsyncSession, thread_id: int) -> dict:
+        # Forks see their parent's modules overlaid with their own rows (NULL data = deleted)
+        fork = await self.inheriting_fork(session, thread_id)
+        memory_structure = await self.effective_modules(session, fork.parent_thread_id) if fork else {}
+        result = await session.execute(select(MemoryModule).filter_by(thread_id=thread_id))
+        for module in result.scalars().all():
+            if module.data is None:
+                memory_structure.pop(module.module_name, None)
+            else:
+                memory_structure[module.module_name] = serialization.loads(module.data)
+        return memory_structure
+
+    async def copy_to_forks(self, session: AsyncSession, thread_id: int):
+        """Copy-on-write: gives forks that still inherit this thread's memory their own copy before it changes."""
+        stmt = select(ThreadFork).filter_by(parent_thread_id=thread_id, inherits_memory=1)
+        forks = (await session.execute(stmt)).scalars().all()
+        if not forks:
+            return
+        memory_structure = await self.effective_modules(session, thread_id)
+        for fork in forks:
+            result = await session.execute(select(MemoryModule.module_name).filter_by(thread_id=fork.thread_id))
+            own_modules = set(result.scalars().all())
+            for module_name, data in memory_structure.items():
+                if module_name not in own_modules:
+                    session.add(MemoryModule(thread_id=fork.thread_id, module_name=module_name, data=serialization.dumps(data)))
+            # Tombstones are meaningless once nothing is inherited
+            await session.execute(delete(MemoryModule).where(MemoryModule.thread_id == fork.thread_id, MemoryModule.data.is_(None)))
+            fork.inherits_memory = 0
+        await session.flush()
+
+    async def write(self, operation):
+        if self.db.write_buffer is not None:
+            # The buffer already runs writes one at a time
+            return await self.db.write(operation)
         async with self.lock:
-            async with self.session_scope() as session:
-                try:
-                    stmt = select(MemoryModule).filter_by(
-                        thread_id=thread_id, module_name=module_name
-                    ).with_for_update()
-                    result = await session.execute(stmt)
-                    memory_module = result.scalar_one_or_none()
-
-                    if memory_module:
-                        memory_module.data = json.dumps(data)
-                        logging.info(f"Updated module: {module_name} for thread: {thread_id}")
-                    else:
-                        new_module = MemoryModule(
-                            thread_id=thread_id,
-                            module_name=module_name,
-                            data=json.dumps(data)
-                        )
-                        session.add(new_module)
-                        logging.info(f"Added new module: {module_name} for thread: {thread_id}")
-                    await session.flush()
-                except IntegrityError:
-                    logging.error(f"IntegrityError while adding/updating module: {module_name}", exc_info=True)
-                    raise
+            return await self.db.write(operation)
+
+    async def add_or_update_module(self, thread_id: int, module_name: str, data: dict):
+        async def write(session: AsyncSession):
+            try:
+                await self.copy_to_forks(session, thread_id)
+                stmt = select(MemoryModule).filter_by(
+                    thread_id=thread_id, module_name=module_name
+                ).with_for_update()
+                result = await session.execute(stmt)
+                memory_module = result.scalar_one_or_none()
+
+                if memory_module:
+                    memory_module.data = serialization.dumps(data)
+                    logging.info(f"Updated module: {module_name} for thread: {thread_id}")
+                else:
+                    new_module = MemoryModule(
+                        thread_id=thread_id,
+                        module_name=module_name,
+                        data=serialization.dumps(data)
+                    )
+                    session.add(new_module)
+                    logging.info(f"Added new module: {module_name} for thread: {thread_id}")
+                await session.flush()
+                await self.search_index.index_module(session, thread_id, module_name, data)
+            except IntegrityError:
+                logging.error(f"IntegrityError while adding/updating module: {module_name}", exc_info=True)
+                raise
+
+        await self.write(write)
 
     async def get_module(self, thread_id: int, module_name: str):
         async with self.session_scope() as session:
@@ -58,52 +105,64 @@ class WorkingMemory:
             )
             result = await session.execute(stmt)
             memory_module = result.scalar_one_or_none()
-            if memory_module:
+            if memory_module and memory_module.data is not None:
                 logging.info(f"Retrieved module: {module_name} for thread: {thread_id}")
-                return json.loads(memory_module.data)
-            else:
-                logging.info(f"Module not found: {module_name} for thread: {thread_id}")
-                return None
+                return serialization.loads(memory_module.data)
+            fork = await self.inheriting_fork(session, thread_id) if memory_module is None else None
+            if fork:
+                return await self.get_module(fork.parent_thread_id, module_name)
+            logging.info(f"Module not found: {module_name} for thread: {thread_id}")
+            return None
 
     async def delete_module(self, thread_id: int, module_name: str):
-        async with self.lock:
-            async with self.session_scope() as session:
-                stmt = select(MemoryModule).filter_by(
-                    thread_id=thread_id, module_name=module_name
-                ).with_for_update()
-                result = await session.execute(stmt)
-                memory_module = result.scalar_one_or_none()
+        async def write(session: AsyncSession):
+            await self.copy_to_forks(session, thread_id)
+            stmt = select(MemoryModule).filter_by(
+                thread_id=thread_id, module_name=module_name
+            ).with_for_update()
+            result = await session.execute(stmt)
+            memory_module = result.scalar_one_or_none()
+            if await self.inheriting_fork(session, thread_id):
+                # Keep a tombstone so the parent's module stays hidden
                 if memory_module:
-                    await session.delete(memory_module)
-                    logging.info(f"Deleted module: {module_name} for thread: {thread_id}")
+                    memory_module.data = None
                 else:
-                    logging.info(f"Module not found for deletion: {module_name} for thread: {thread_id}")
+                    session.add(MemoryModule(thread_id=thread_id, module_name=module_name, data=None))
+                await self.search_index.remove_module(session, thread_id, module_name)
+                logging.info(f"Deleted module: {module_name} for thread: {thread_id}")
+            elif memory_module:
+                await session.delete(memory_module)
+                await self.search_index.remove_module(session, thread_id, module_name)
+                logging.info(f"Deleted module: {module_name} for thread: {thread_id}")
+            else:
+                logging.info(f"Module not found for deletion: {module_name} for thread: {thread_id}")
+
+        await self.write(write)
 
     async def export_memory(self, thread_id: int):
         async with self.session_scope() as session:
+            memory_structure = await self.effective_modules(session, thread_id)
+            logging.info(f"Exported memory for thread: {thread_id}")
+            return memory_structure
+
+    async def clear_memory(self, thread_id: int):
+        async def write(session: AsyncSession):
+            await self.copy_to_forks(session, thread_id)
             stmt = select(MemoryModule).filter_by(thread_id=thread_id)
             result = await session.execute(stmt)
             memory_modules = result.scalars().all()
-            memory_structure = {}
             for module in memory_modules:
-                memory_structure[module.module_name] = json.loads(module.data)
-            logging.info(f"Exported memory for thread: {thread_id}")
-            return memory_structure
+                await session.delete(module)
+            fork = await self.inheriting_fork(session, thread_id)
+            if fork:
+                fork.inherits_memory = 0
+            await self.search_index.remove_module(session, thread_id)
+            logging.info(f"Cleared memory for thread: {thread_id}")
 
-    async def clear_memory(self, thread_id: int):
-        async with self.lock:
-            async with self.session_scope() as session:
-                stmt = select(MemoryModule).filter_by(thread_id=thread_id)
-                result = await session.execute(stmt)
-                memory_modules = result.scalars().all()
-                for module in memory_modules:
-                    await session.delete(module)
-                logging.info(f"Cleared memory for thread: {thread_id}")
+        await self.write(write)
 
     async def get_modules(self, thread_id: int):
         async with self.session_scope() as session:
-            stmt = select(MemoryModule.module_name).filter_by(thread_id=thread_id)
-            result = await session.execute(stmt)
-            modules = result.scalars().all()
+            modules = list((await self.effective_modules(session, thread_id)).keys())
             logging.info(f"Retrieved module names for thread: {thread_id}")
             return modules
\ No newline at end of file
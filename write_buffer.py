@@ -0,0 +1,132 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+import tracing
+
+WriteOperation = Callable[[AsyncSession], Awaitable[Any]]
+
+
+class GroupCommitBuffer:
+    """Coalesces writes from concurrent callers into shared transactions (group commit).
+
+    A write is a coroutine function taking a session. Queued writes run one after another
+    on a single worker and are committed together once `commit_interval` seconds have
+    passed since the first of them or `max_batch_size` are queued, so SQLite pays one
+    commit (and fsync) per batch instead of one per write.
+
+    Durable submits return after their batch has committed. Non-durable submits return
+    immediately; their errors are only logged. If a batch fails, its writes are retried
+    one transaction each, so a failing write doesn't take the others down with it.
+    """
+
+    def __init__(self, session_factory: Callable[[], AsyncSession], commit_interval: float = 0.005, max_batch_size: int = 64):
+        self.session_factory = session_factory
+        self.commit_interval = commit_interval
+        self.max_batch_size = max_batch_size
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.unacknowledged = 0
+        self.stats = {"transactions": 0, "operations": 0, "failed": 0}
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self.worker is None or self.worker.done() or self.loop is not loop:
+            self.loop = loop
+            self.queue = asyncio.Queue()
+            self.worker = loop.create_task(self.run())
+
+    def in_worker(self) -> bool:
+        return self.worker is not None and asyncio.current_task() is self.worker
+
+    async def submit(self, operation: WriteOperation, durable: bool = True) -> Any:
+        if self.in_worker():
+            raise RuntimeError("Writes can't be submitted from inside a buffered write")
+        self.start()
+        future = self.loop.create_future()
+        self.queue.put_nowait((operation, future))
+        if durable:
+            return await future
+        self.unacknowledged += 1
+        future.add_done_callback(self.acknowledge)
+        return None
+
+    def acknowledge(self, future: asyncio.Future):
+        self.unacknowledged -= 1
+        if not future.cancelled() and future.exception() is not None:
+            logging.error(f"Buffered write failed: {future.exception()}")
+
+    async def flush(self):
+        """Waits until everything submitted so far has been committed."""
+        if self.worker is None or self.worker.done() or self.in_worker() or self.loop is not asyncio.get_running_loop():
+            return
+        future = self.loop.create_future()
+        self.queue.put_nowait((None, future))
+        await future
+
+    async def run(self):
+        while True:
+            batch = [await self.queue.get()]
+            deadline = self.loop.time() + self.commit_interval
+            while len(batch) < self.max_batch_size and batch[-1][0] is not None:
+                timeout = deadline - self.loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.commit_batch(batch)
+
+    async def run_in_transaction(self, operations: List[WriteOperation]) -> List[Any]:
+        async with self.session_factory() as session:
+            try:
+                results = [await operation(session) for operation in operations]
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+        self.stats["transactions"] += 1
+        self.stats["operations"] += len(operations)
+        return results
+
+    async def commit_batch(self, batch: List[Tuple[Optional[WriteOperation], asyncio.Future]]):
+        writes = [(operation, future) for operation, future in batch if operation is not None]
+        if writes:
+            with tracing.span("db.group_commit", {"operations": len(writes)}):
+                try:
+                    results = await self.run_in_transaction([operation for operation, _ in writes])
+                    outcomes = [(future, result, None) for (_, future), result in zip(writes, results)]
+                except Exception as e:
+                    if len(writes) == 1:
+                        outcomes = [(writes[0][1], None, e)]
+                    else:
+                        outcomes = [await self.commit_alone(operation, future) for operation, future in writes]
+            for future, result, error in outcomes:
+                if future.done():
+                    continue
+                if error is not None:
+                    self.stats["failed"] += 1
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+        for operation, future in batch:
+            if operation is None and not future.done():
+                future.set_result(None)
+
+    async def commit_alone(self, operation: WriteOperation, future: asyncio.Future) -> Tuple[asyncio.Future, Any, Optional[Exception]]:
+        try:
+            return future, (await self.run_in_transaction([operation]))[0], None
+        except Exception as e:
+            return future, None, e
+
+    async def close(self):
+        await self.flush()
+        if self.worker is not None and not self.worker.done():
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+        self.worker = None